@@ -9,6 +9,12 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY="dev",
         DATABASE=os.path.join(app.instance_path, "photos.db"),
+        # read-only connections kept open between requests, see db.py
+        DATABASE_POOL_SIZE=8,
+        DATABASE_MMAP_SIZE=256 * 2**20,
+        DATABASE_CACHED_STATEMENTS=128,
+        # gallery pages kept until the database changes
+        DATABASE_CACHE_ENTRIES=256,
     )
 
     if test_config is None:
@@ -24,6 +30,10 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    from . import db
+
+    db.init_app(app)
+
     with app.app_context():
         # a simple page that says hello
         @app.route("/hello")
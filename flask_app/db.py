@@ -0,0 +1,230 @@
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from flask import current_app, g
+
+from sql_queries.day_summary import refresh_day_summary
+from sql_queries.migrations import migrate
+
+
+class ConnectionPool:
+    """
+    Read-only SQLite connections shared by the requests of one app.
+
+    A request checks a connection out on its first query and returns it when
+    its app context tears down, so connection setup and the statement cache
+    are paid once per connection instead of once per request. A connection is
+    only used by one thread at a time. The first connection switches the
+    database to WAL so the gallery keeps reading while the population scripts
+    write.
+    """
+
+    def __init__(
+        self, database_path, pool_size=8, mmap_size=256 * 2**20, cached_statements=128
+    ):
+        """
+        Args:
+            pool_size: idle connections kept for reuse, 0 opens one per request
+            mmap_size: bytes of the database file read through mmap
+            cached_statements: prepared statements cached per connection
+        """
+        self.database_path = database_path
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.pool_size = pool_size
+        self.idle = queue.LifoQueue(maxsize=pool_size)
+        self.wal_checked = False
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def _enable_wal(self):
+        # journal_mode is stored in the database file, but setting it needs a
+        # writable connection
+        with self.lock:
+            if self.wal_checked:
+                return
+            try:
+                conn = sqlite3.connect(self.database_path)
+                mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+                conn.close()
+                if mode != "wal":
+                    print(f"db.py:: {self.database_path} stays in {mode} journal mode")
+            except sqlite3.OperationalError as e:
+                print(f"db.py:: could not switch {self.database_path} to WAL: {e}")
+            self.wal_checked = True
+
+    def _connect(self):
+        if not self.wal_checked:
+            self._enable_wal()
+        conn = sqlite3.connect(
+            f"file:{self.database_path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        self.opened += 1
+        return conn
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        if self.pool_size == 0:
+            conn.close()
+            return
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def database_version(database_path):
+    """
+    Changes whenever a write lands in the database. In WAL mode commits go to
+    the -wal file and only reach the database file at checkpoints, so both
+    files are checked.
+    """
+    version = []
+    for suffix in ("", "-wal"):
+        try:
+            stat = os.stat(database_path + suffix)
+            version += [stat.st_mtime_ns, stat.st_size]
+        except FileNotFoundError:
+            version += [None, None]
+    return tuple(version)
+
+
+class VersionedCache:
+    """
+    LRU of results computed from the database, emptied as soon as the
+    database files change. Checking costs two stat calls, so a cached page
+    needs neither a connection nor a query.
+    """
+
+    def __init__(self, database_path, max_entries=256, on_change=None):
+        """
+        Args:
+            on_change: called when the database changed, before anything is
+                computed from it
+        """
+        self.database_path = database_path
+        self.max_entries = max_entries
+        self.on_change = on_change
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key, compute):
+        """The cached value of key, compute() when missing or stale."""
+        version = database_version(self.database_path)
+        if self.on_change is not None and version != self.version:
+            self.on_change()
+            version = database_version(self.database_path)
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.version = version
+            elif key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        value = compute()
+        with self.lock:
+            # a write during compute() already moved the version on
+            if version == self.version:
+                self.entries[key] = value
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return value
+
+
+class DaySummaryRefresher:
+    """
+    Keeps day_summary in step with copied and the tags through its own
+    writable connection, since the pool's connections are read-only.
+    """
+
+    def __init__(self, database_path):
+        self.database_path = database_path
+        self.lock = threading.Lock()
+
+    def _run(self, fn):
+        if not os.path.exists(self.database_path):
+            return None
+        with self.lock:
+            try:
+                conn = sqlite3.connect(self.database_path, timeout=5)
+                try:
+                    return fn(conn)
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                # the gallery falls back to reading the days from copied
+                print(f"db.py:: could not update {self.database_path}: {e}")
+                return None
+
+    def migrate(self):
+        """Migrate the database and rebuild day_summary if needed, on start-up."""
+        return self._run(lambda conn: (migrate(conn), refresh_day_summary(conn)))
+
+    def refresh(self):
+        """Rebuild day_summary when copied or the tags changed since its last rebuild."""
+        days = self._run(refresh_day_summary)
+        if days is not None:
+            print(f"db.py:: rebuilt day_summary, {days} days")
+        return days
+
+
+def get_db():
+    """The request's read-only connection to the photos database."""
+    if "db" not in g:
+        g.db = current_app.extensions["sqlite_pool"].acquire()
+    return g.db
+
+
+def close_db(e=None):
+    db = g.pop("db", None)
+    if db is not None:
+        current_app.extensions["sqlite_pool"].release(db)
+
+
+def cached(key, compute):
+    """compute() through the app's cache of database results."""
+    return current_app.extensions["sqlite_cache"].get(key, compute)
+
+
+def init_app(app):
+    app.extensions["sqlite_pool"] = ConnectionPool(
+        app.config["DATABASE"],
+        pool_size=app.config.get("DATABASE_POOL_SIZE", 8),
+        mmap_size=app.config.get("DATABASE_MMAP_SIZE", 256 * 2**20),
+        cached_statements=app.config.get("DATABASE_CACHED_STATEMENTS", 128),
+    )
+    refresher = DaySummaryRefresher(app.config["DATABASE"])
+    refresher.migrate()
+    app.extensions["sqlite_cache"] = VersionedCache(
+        app.config["DATABASE"],
+        max_entries=app.config.get("DATABASE_CACHE_ENTRIES", 256),
+        on_change=refresher.refresh,
+    )
+    app.teardown_appcontext(close_db)
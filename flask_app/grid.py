@@ -1,5 +1,6 @@
 import sys
 import functools
+import json
 
 from flask import (
     Blueprint,
@@ -13,14 +14,16 @@ from flask import (
     current_app,
 )
 
+from sql_queries.migrations import table_exists
 from sql_queries.queries import (
-    GET_2023_PHOTOS,
-    GET_DATE_TAGS
+    GET_DAY_SUMMARIES,
+    GET_DAY_SUMMARIES_FROM_COPIED,
+    GET_GALLERY_PHOTOS,
 )
 
+from .db import cached, get_db
+
 bp = Blueprint("grid", __name__)
-database_path = current_app.config["DATABASE"]
-print(database_path)
 
 
 @bp.route("/", methods=("GET", "POST"))
@@ -28,27 +31,50 @@ def index():
     return render_template("index.html")
 
 
-import sqlite3
+# The gallery shows one year, a page at a time
+GALLERY_YEAR = "2023"
+DAYS_PER_PAGE = 5
+MAX_DAYS_PER_PAGE = 31
+# a page ends early once it has this many photos, but always has one day
+PHOTOS_PER_PAGE = 200
 
 
-@bp.route("/images", methods=["GET"])
-def images():
-    # Connect to the database
-    conn = sqlite3.connect(database_path)
-    c = conn.cursor()
+def fetch_page(conn, cursor=None, days=DAYS_PER_PAGE):
+    """
+    One page of day groups after cursor.
 
-    # Execute the query to fetch all photos taken in 2023 where DateTaken is not null and order them by taken_date
-    c.execute(GET_2023_PHOTOS)
-    rows = c.fetchall()
+    Args:
+        cursor: last day of the previous page, None for the first page
+        days: most day groups per page
+    Return:
+        [(day, [(file_name, width, height), ...]), ...], {day: [tag, ...]},
+        and the cursor of the next page, None on the last page
+    """
+    c = conn.cursor()
+    after = cursor + "~" if cursor else GALLERY_YEAR
+    before = GALLERY_YEAR + "~"
+    # one extra day tells us whether there is a next page
+    if table_exists(conn, "day_summary"):
+        c.execute(GET_DAY_SUMMARIES, (after, before, days + 1))
+    else:
+        c.execute(GET_DAY_SUMMARIES_FROM_COPIED, (after, before, days + 1))
+    summaries = c.fetchall()
+    page = []
+    photo_count = 0
+    for summary in summaries[:days]:
+        if page and photo_count + summary[1] > PHOTOS_PER_PAGE:
+            break
+        page.append(summary)
+        photo_count += summary[1]
+    if not page:
+        return [], {}, None
+    next_cursor = page[-1][0] if len(summaries) > len(page) else None
+    tags = {date: json.loads(day_tags) for date, _, day_tags in page if day_tags != "[]"}
 
-    # Prepare the images data according to the new database definition
+    c.execute(GET_GALLERY_PHOTOS, (after, page[-1][0] + "~"))
     images = []
     current_day = None
-    for row in rows:
-        file_name = row[0]
-        image_width = row[1]
-        image_height = row[2]
-        taken_date = row[3]
+    for file_name, image_width, image_height, taken_date in c.fetchall():
         # Convert SQL date time to just date
         taken_date = taken_date.split(" ")[0]
         # images.html expects (day, [(file_name, width, height), ...])
@@ -56,21 +82,58 @@ def images():
             current_day = taken_date
             images.append((current_day, []))
         images[-1][1].append((file_name, image_width, image_height))
+    return images, tags, next_cursor
+
+
+def page_args():
+    cursor = request.args.get("cursor") or None
+    days = request.args.get("days", DAYS_PER_PAGE, type=int)
+    return cursor, max(1, min(days, MAX_DAYS_PER_PAGE))
+
+
+# Rendered pages are cached until the database changes, see db.VersionedCache
+@bp.route("/images", methods=["GET"])
+def images():
+    cursor, days = page_args()
+
+    def render():
+        images, tags, next_cursor = fetch_page(get_db(), cursor, days)
+        return render_template(
+            "images.html", images=images, tags=tags, next_cursor=next_cursor, days=days
+        )
+
+    return cached(("images", cursor, days), render)
 
-    # Fetch the tags associated with each day
-    c.execute(GET_DATE_TAGS)
-    tag_rows = c.fetchall()
 
-    # Prepare the tags data
-    tags = {}
-    for row in tag_rows:
-        date = row[0]
-        tag = row[1]
-        if date not in tags:
-            tags[date] = []
-        tags[date].append(tag)
+@bp.route("/api/images", methods=["GET"])
+def images_api():
+    cursor, days = page_args()
 
-    # Close the connection
-    conn.close()
+    def render():
+        images, tags, next_cursor = fetch_page(get_db(), cursor, days)
+        return current_app.json.dumps(
+            {
+                "days": [
+                    {
+                        "day": day,
+                        "tags": tags.get(day, []),
+                        "images": [
+                            {
+                                "file_name": file_name,
+                                "url": url_for(
+                                    "static", filename="converted_photos/" + file_name
+                                ),
+                                "width": width,
+                                "height": height,
+                            }
+                            for file_name, width, height in day_images
+                        ],
+                    }
+                    for day, day_images in images
+                ],
+                "next_cursor": next_cursor,
+            }
+        )
 
-    return render_template("images.html", images=images, tags=tags)
+    body = cached(("api", cursor, days), render)
+    return current_app.response_class(body, mimetype="application/json")
@@ -1,7 +1,10 @@
 import PhotoSwipeLightbox from 'https://unpkg.com/photoswipe/dist/photoswipe-lightbox.esm.js';
 
+// #main-gallery is filled page by page as the user scrolls. The lightbox
+// listens for clicks on the gallery and collects its links when opened, so
+// pages appended later are part of the slideshow without re-initializing.
 const lightbox = new PhotoSwipeLightbox({
-  gallery: '#my-gallery',
+  gallery: '#main-gallery',
   children: 'a',
   pswpModule: () => import('https://unpkg.com/photoswipe'),
 });
@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "streamlit_app"))
+import numpy as np
+from vector_store import LocalVectorStore
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines ANN recall/latency benchmark")
+parser.add_argument("--rows", type=int, default=200_000)
+parser.add_argument("--dim", type=int, default=512)
+parser.add_argument("--queries", type=int, default=200)
+parser.add_argument("--top_k", type=int, default=10)
+parser.add_argument("--nprobes", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+parser.add_argument("--dtype", choices=["float32", "float16"], default="float16")
+
+
+def clustered_embeddings(rows, dim, clusters=200, seed=0):
+    """CLIP embeddings of a photo library cluster around events and subjects."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, rows)
+    vectors = centers[labels] + 2.0 * rng.normal(size=(rows, dim)).astype(np.float32)
+    return vectors, rng
+
+
+def build(store, vectors, batch_size=10_000):
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch_size):
+        chunk = vectors[offset : offset + batch_size]
+        store.upsert(
+            [(f"id{offset + i}", v, {}) for i, v in enumerate(chunk)], namespace="bench"
+        )
+    return time.perf_counter() - start
+
+
+def run_queries(store, queries, top_k):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        matches = store.query(query, top_k=top_k, namespace="bench", include_metadata=False)
+        results.append({match["id"] for match in matches["matches"]})
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    args = parser.parse_args()
+    vectors, rng = clustered_embeddings(args.rows, args.dim)
+    queries = vectors[rng.choice(args.rows, args.queries)] + 0.3 * rng.normal(
+        size=(args.queries, args.dim)
+    ).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as root:
+        exact = LocalVectorStore(os.path.join(root, "exact"), dim=args.dim, dtype=args.dtype)
+        build_seconds = build(exact, vectors)
+        truth, latency = run_queries(exact, queries, args.top_k)
+        print(f"{args.rows:,} x {args.dim} {args.dtype}, recall@{args.top_k}")
+        print(f"exact:      recall 1.000  {latency * 1000:7.2f} ms/query  (build {build_seconds:.1f}s)")
+
+        ivf = LocalVectorStore(
+            os.path.join(root, "ivf"), dim=args.dim, dtype=args.dtype, index_type="ivf"
+        )
+        build_seconds = build(ivf, vectors)
+        nlist = len(ivf.namespaces["bench"].ann.centroids)
+        print(f"ivf nlist={nlist} built in {build_seconds:.1f}s")
+        for nprobe in args.nprobes:
+            ivf.nprobe = nprobe
+            found, latency = run_queries(ivf, queries, args.top_k)
+            recall = np.mean([len(f & t) / args.top_k for f, t in zip(found, truth)])
+            print(f"nprobe={nprobe:<4} recall {recall:.3f}  {latency * 1000:7.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
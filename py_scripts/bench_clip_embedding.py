@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "streamlit_app"))
+import numpy as np
+from PIL import Image
+from sentence_transformers import SentenceTransformer
+from clip_embedding import BatchedEmbedder
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines CLIP embedding benchmark")
+parser.add_argument("--count", type=int, default=512)
+parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 16, 32, 64, 128])
+parser.add_argument("--threads", type=int, nargs="+", default=[os.cpu_count()])
+parser.add_argument("--preprocess_workers", type=int, default=4)
+
+
+def fake_images(count, size=224):
+    rng = np.random.default_rng(0)
+    return [
+        Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+        for _ in range(count)
+    ]
+
+
+def main():
+    args = parser.parse_args()
+    model = SentenceTransformer("sentence-transformers/clip-ViT-B-32")
+    images = fake_images(args.count)
+
+    # The per-image encode loop ModalEmbedding.generate used to run
+    start = time.perf_counter()
+    for image in images[:64]:
+        model.encode(image)
+    print(f"per-image encode: {64 / (time.perf_counter() - start):.1f} images/sec")
+
+    for threads in args.threads:
+        for batch_size in args.batch_sizes:
+            embedder = BatchedEmbedder(
+                model,
+                batch_size=batch_size,
+                preprocess_workers=args.preprocess_workers,
+                num_threads=threads,
+            )
+            for start in range(0, len(images), batch_size):
+                embedder(images[start : start + batch_size])
+            print(
+                f"threads={threads:<3} batch_size={batch_size:<4} "
+                f"{embedder.images_per_second():.1f} images/sec"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import io
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "streamlit_app"))
+import numpy as np
+from PIL import Image, ImageFilter, ImageOps
+from image_pipeline import ImagePipeline
+from photo_urls import caption_url, embed_url, thumbnail_url
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines image size benchmark")
+parser.add_argument("--count", type=int, default=1000)
+parser.add_argument("--width", type=int, default=4032)
+parser.add_argument("--height", type=int, default=3024)
+parser.add_argument("--download_workers", type=int, default=16)
+parser.add_argument("--decode_workers", type=int, default=4)
+
+SIZE_SUFFIX = re.compile(r"=w(\d+)-h(\d+)(-c)?$")
+
+
+def fake_photo(width, height):
+    """Blurred noise, which JPEG compresses about as well as a real photo."""
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    image = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+    return image.filter(ImageFilter.GaussianBlur(1))
+
+
+def encode(image):
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def serve(original):
+    """Serve original for bare urls and resize like Google Photos for =wNNN-hNNN urls."""
+    renditions = {}
+    lock = threading.Lock()
+
+    def rendition(suffix):
+        with lock:
+            if suffix not in renditions:
+                match = SIZE_SUFFIX.search(suffix)
+                width, height, crop = int(match[1]), int(match[2]), match[3]
+                if crop:
+                    image = ImageOps.fit(original, (width, height))
+                else:
+                    image = original.copy()
+                    image.thumbnail((width, height))
+                renditions[suffix] = encode(image)
+            return renditions[suffix]
+
+    full = encode(original)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = SIZE_SUFFIX.search(self.path)
+            body = rendition(match[0]) if match else full
+            self.send_response(200)
+            self.send_header("content-type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/media/"
+
+
+def clip_preprocess(images):
+    # What the CLIP processor does before the model sees the pixels
+    return [ImageOps.fit(image, (224, 224)) for image in images]
+
+
+def main():
+    args = parser.parse_args()
+    server, base = serve(fake_photo(args.width, args.height))
+    items = [(f"id{i}", f"{base}{i}") for i in range(args.count)]
+
+    for name, url_fn in [
+        ("original", lambda url: url),
+        ("embed", embed_url),
+        ("caption", caption_url),
+        ("thumbnail", thumbnail_url),
+    ]:
+        pipeline = ImagePipeline(
+            clip_preprocess,
+            download_workers=args.download_workers,
+            decode_workers=args.decode_workers,
+            url_fn=url_fn,
+        )
+        start = time.perf_counter()
+        count = sum(len(ids) for ids, _ in pipeline.run(items))
+        elapsed = time.perf_counter() - start
+        per_1k = 1000 / count
+        print(
+            f"{name:>9}: {pipeline.bytes_downloaded * per_1k / 2**20:8.1f} MiB "
+            f"and {elapsed * per_1k:6.2f}s per 1k images"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
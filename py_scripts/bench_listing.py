@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "streamlit_app"))
+import requests
+from photos_listing import MediaItemLister
+from stub_photos_server import serve
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines listing benchmark")
+parser.add_argument("--days", type=int, default=90)
+parser.add_argument("--items_per_day", type=int, default=150)
+parser.add_argument("--latency_ms", type=float, default=50)
+parser.add_argument("--workers", type=int, default=8)
+parser.add_argument("--window_days", type=int, default=7)
+
+
+def legacy_listing(search_url, sdate, edate):
+    """One un-paginated POST per calendar day, like the code this replaces."""
+    items = []
+    day = sdate
+    while day < edate:
+        payload = {
+            "filters": {
+                "dateFilter": {
+                    "dates": [{"day": day.day, "month": day.month, "year": day.year}]
+                }
+            }
+        }
+        res = requests.post(search_url, data=json.dumps(payload))
+        items.extend(res.json().get("mediaItems", []))
+        day += timedelta(days=1)
+    return items
+
+
+def main():
+    args = parser.parse_args()
+    server, search_url = serve(0, args.items_per_day, args.latency_ms)
+    sdate = date(2023, 1, 1)
+    edate = sdate + timedelta(days=args.days)
+    expected = args.days * args.items_per_day
+
+    start = time.perf_counter()
+    items = legacy_listing(search_url, sdate, edate)
+    elapsed = time.perf_counter() - start
+    print(
+        f"legacy per-day:  {len(items)}/{expected} items, {args.days} requests, "
+        f"{elapsed:.2f}s, {len(items) / elapsed:.0f} items/s"
+    )
+
+    lister = MediaItemLister(
+        "stub-token",
+        search_url=search_url,
+        max_workers=args.workers,
+        window_days=args.window_days,
+        requests_per_second=None,
+    )
+    start = time.perf_counter()
+    first_item = None
+    count = 0
+    for _ in lister.stream(sdate, edate):
+        if first_item is None:
+            first_item = time.perf_counter() - start
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(
+        f"paginated x{args.workers}: {count}/{expected} items, "
+        f"{lister.requests_made} requests, {elapsed:.2f}s, "
+        f"{count / elapsed:.0f} items/s, first item after {first_item * 1000:.0f}ms"
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "streamlit_app"))
+import numpy as np
+from media_items import normalize_media_items
+from media_catalog import MediaCatalog
+from stub_photos_server import fake_media_item
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines media catalog memory benchmark")
+parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+parser.add_argument("--dim", type=int, default=512)
+
+
+def session_frame(n, dim, rng):
+    """The session-state frame: a list of floats per vector, a dict per metadata."""
+    start = date(2020, 1, 1)
+    items = [fake_media_item(start + timedelta(days=i // 200), i % 200) for i in range(n)]
+    media_items_df = normalize_media_items(items)
+    media_items_df["vector"] = rng.normal(size=(n, dim)).astype(np.float32).tolist()
+    media_items_df["metadata"] = media_items_df.loc[
+        :, ["id", "year", "month", "day"]
+    ].to_dict("records")
+    return media_items_df
+
+
+def traced(build):
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def main():
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    for n in args.sizes:
+        media_items_df, frame_bytes = traced(lambda: session_frame(n, args.dim, rng))
+        catalog, catalog_bytes = traced(lambda: MediaCatalog.from_frame(media_items_df))
+
+        ids = list(rng.choice(media_items_df["id"].values, 10))
+        start = time.perf_counter()
+        for _ in range(1000):
+            catalog.hydrate(ids)
+        hydrate_us = (time.perf_counter() - start) * 1000
+
+        print(
+            f"{n:>7,} items  frame {frame_bytes / 2**20:8.1f} MiB  "
+            f"catalog {catalog_bytes / 2**20:7.1f} MiB  "
+            f"({frame_bytes / catalog_bytes:4.1f}x)  hydrate 10 ids {hydrate_us:.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "streamlit_app"))
+import pandas as pd
+from media_items import normalize_media_items
+from stub_photos_server import fake_media_item
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines media item frame benchmark")
+parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+parser.add_argument("--legacy_sizes", type=int, nargs="*", default=[1_000, 5_000])
+
+
+def fake_records(n, items_per_day=200):
+    start = date(2020, 1, 1)
+    return [
+        fake_media_item(start + timedelta(days=i // items_per_day), i % items_per_day)
+        for i in range(n)
+    ]
+
+
+def legacy_frame(items):
+    """The per-item DataFrame + pd.concat construction this module replaced."""
+    media_items_df = pd.DataFrame()
+    for item in items:
+        items_df = pd.DataFrame(item)
+        items_df = items_df.rename(columns={"mediaMetadata": "creationTime"})
+        items_df = items_df[items_df.index == "creationTime"]
+        media_items_df = pd.concat([media_items_df, items_df])
+    media_items_df["year"] = [int(x) for x in media_items_df["creationTime"].str[0:4].values]
+    media_items_df["month"] = [int(x) for x in media_items_df["creationTime"].str[5:7].values]
+    media_items_df["day"] = [int(x) for x in media_items_df["creationTime"].str[8:10].values]
+    return media_items_df.reset_index(drop=True)
+
+
+def timed(fn, records):
+    start = time.perf_counter()
+    frame = fn(records)
+    return frame, time.perf_counter() - start
+
+
+def main():
+    args = parser.parse_args()
+    for n in args.legacy_sizes:
+        records = fake_records(n)
+        legacy, legacy_elapsed = timed(legacy_frame, records)
+        frame, elapsed = timed(normalize_media_items, records)
+        assert (legacy["year"].values == frame["year"].values).all()
+        print(
+            f"{n:>9,} items  legacy {legacy_elapsed:8.3f}s  "
+            f"normalized {elapsed:8.3f}s  ({legacy_elapsed / elapsed:.0f}x)"
+        )
+    for n in args.sizes:
+        records = fake_records(n)
+        frame, elapsed = timed(normalize_media_items, records)
+        print(
+            f"{n:>9,} items  normalized {elapsed:8.3f}s  "
+            f"{n / elapsed:,.0f} items/s  {frame.memory_usage(deep=True).sum() / 2**20:.0f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
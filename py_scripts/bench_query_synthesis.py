@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "streamlit_app"))
+import numpy as np
+from query_synthesis import QuerySynthesizer, StubLLMChain
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines query synthesis latency benchmark")
+parser.add_argument("--searches", type=int, default=60)
+parser.add_argument("--llm_latency", type=float, default=0.5)
+parser.add_argument("--slow_fraction", type=float, default=0.1)
+parser.add_argument("--timeout", type=float, default=1.0)
+
+TERMS = ["beach", "sunset", "dog", "birthday cake", "snow", "hiking", "city at night", "family"]
+
+
+def journeys(count, rng):
+    """Journeys of one to three refinements; popular ones are searched again."""
+    popular = [
+        [str(t) for t in rng.choice(TERMS, rng.integers(1, 4), replace=False)]
+        for _ in range(count // 4)
+    ]
+    return [
+        popular[rng.integers(len(popular))]
+        if rng.random() < 0.5
+        else [str(t) for t in rng.choice(TERMS, rng.integers(1, 4), replace=False)]
+        for _ in range(count)
+    ]
+
+
+class FlakyStub(StubLLMChain):
+    """A stub whose completions occasionally take ten times longer."""
+
+    def __init__(self, latency, slow_fraction, rng):
+        super().__init__(latency)
+        self.base_latency = latency
+        self.slow_fraction = slow_fraction
+        self.rng = rng
+
+    def predict(self, queries):
+        slow = self.rng.random() < self.slow_fraction
+        self.latency = self.base_latency * (10 if slow else 1)
+        return super().predict(queries)
+
+
+def prompt_for(journey):
+    return f"User Queries: {', '.join(journey)}\n"
+
+
+def run(name, synthesize, workload):
+    latencies = []
+    for journey in workload:
+        start = time.perf_counter()
+        synthesize(journey)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    print(
+        f"{name:<22} mean {latencies.mean():7.1f} ms  p95 {np.percentile(latencies, 95):7.1f} ms"
+        f"  max {latencies.max():7.1f} ms"
+    )
+
+
+def main():
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    workload = journeys(args.searches, rng)
+
+    llm = FlakyStub(args.llm_latency, args.slow_fraction, np.random.default_rng(1))
+    run("always llm", lambda journey: llm.predict(prompt_for(journey)), workload)
+    print(f"{'':<22} {llm.calls} llm calls")
+
+    llm = FlakyStub(args.llm_latency, args.slow_fraction, np.random.default_rng(1))
+    synthesizer = QuerySynthesizer(llm, timeout=args.timeout)
+    run(
+        "cache+skip+timeout",
+        lambda journey: synthesizer.synthesize(prompt_for(journey), journey),
+        workload,
+    )
+    print(f"{'':<22} {llm.calls} llm calls, {synthesizer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import numpy as np
+from sql_queries.day_summary import rebuild_day_summary
+from sql_queries.migrations import migrate
+from sql_queries.queries import (
+    CREATE_PHOTOS_TABLE,
+    GET_2023_PHOTOS,
+    GET_DATE_TAGS,
+    GET_DAY_SUMMARIES,
+    GET_GALLERY_PHOTOS,
+    GET_PHOTO_BY_DATE,
+)
+
+# The queries before the date columns
+LEGACY_PHOTO_BY_DATE = """
+SELECT DISTINCT FileName FROM copied WHERE SUBSTR(DateTaken, 1, 10) = ?
+"""
+LEGACY_2023_PHOTOS = """
+SELECT DISTINCT FileName, ImageWidth, ImageHeight, DateTaken
+FROM copied
+WHERE DateTaken IS NOT NULL
+AND SUBSTR(DateTaken, 1, 4) = '2023'
+ORDER BY DateTaken
+"""
+LEGACY_GALLERY_DAYS = """
+SELECT DISTINCT SUBSTR(DateTaken, 1, 10) AS day
+FROM copied
+WHERE SUBSTR(DateTaken, 1, 10) > ? AND SUBSTR(DateTaken, 1, 10) < ?
+ORDER BY day
+LIMIT ?
+"""
+
+PETA_TAGS = 40
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines SQLite query benchmark")
+parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+parser.add_argument("--years", type=int, default=10, help="years the photos span")
+parser.add_argument("--repeats", type=int, default=20)
+
+
+def build_database(path, n, years):
+    """A copied table of n photos with EXIF dates, as populate_database.py writes them."""
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_PHOTOS_TABLE.replace("photos", "copied"))
+    rng = random.Random(0)
+    rows = []
+    for i in range(n):
+        year = 2024 - years + rng.randrange(years)
+        date_taken = (
+            f"{year}:{rng.randint(1, 12):02d}:{rng.randint(1, 28):02d} "
+            f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        )
+        name = f"IMG_{i}.jpg"
+        rows.append((name, f"/album/{name}", name, 1, 4032, 3024, date_taken))
+    with conn:
+        conn.executemany(
+            "INSERT INTO copied (PhotoID, FilePath, FileName, FileSize, ImageWidth, "
+            "ImageHeight, DateTaken) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        # a few PETA tags for every day, keyed by ISO date like the gallery days
+        conn.execute("CREATE TABLE PETA_tags (id INTEGER PRIMARY KEY, tag TEXT)")
+        conn.execute("CREATE TABLE dates_have_tags (date TEXT, tag_id INTEGER)")
+        conn.executemany(
+            "INSERT INTO PETA_tags (id, tag) VALUES (?, ?)",
+            [(i, f"tag {i}") for i in range(PETA_TAGS)],
+        )
+        days = {row[6][:10].replace(":", "-") for row in rows}
+        conn.executemany(
+            "INSERT INTO dates_have_tags (date, tag_id) VALUES (?, ?)",
+            [(day, tag) for day in sorted(days) for tag in rng.sample(range(PETA_TAGS), 3)],
+        )
+    return conn
+
+
+def timed(conn, query, params, repeats):
+    """Median milliseconds of query, and its plan."""
+    plan = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+    plan = " / ".join(row[-1] for row in plan)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000, plan
+
+
+def main():
+    args = parser.parse_args()
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = build_database(os.path.join(tmp, "photos.db"), n, args.years)
+            # the legacy queries match DateTaken as written, EXIF "YYYY:MM:DD"
+            legacy = [
+                ("photo by date", LEGACY_PHOTO_BY_DATE, ("2023:06:15",)),
+                ("2023 photos", LEGACY_2023_PHOTOS, ()),
+                ("gallery days", LEGACY_GALLERY_DAYS, ("2023:06:15", "2023~", 6)),
+                ("date tags", GET_DATE_TAGS, ()),
+            ]
+            legacy = [
+                (name, *timed(conn, query, params, args.repeats))
+                for name, query, params in legacy
+            ]
+            start = time.perf_counter()
+            migrate(conn)
+            migration = time.perf_counter() - start
+            start = time.perf_counter()
+            rebuild_day_summary(conn)
+            rebuild = time.perf_counter() - start
+            # day_summary returns the days of a page and their tags in one query
+            page = ("2023-06-15~", "2023~", 6)
+            migrated = [
+                ("photo by date", GET_PHOTO_BY_DATE, ("2023-06-15",)),
+                ("2023 photos", GET_2023_PHOTOS, ()),
+                ("gallery days", GET_DAY_SUMMARIES, page),
+                ("date tags", GET_DAY_SUMMARIES, page),
+            ]
+            migrated = [
+                (name, *timed(conn, query, params, args.repeats))
+                for name, query, params in migrated
+            ]
+            # the photos of the gallery page, which had no legacy equivalent
+            days = conn.execute(GET_DAY_SUMMARIES, ("2023-06-15~", "2023~", 5)).fetchall()
+            page_ms, _ = timed(
+                conn, GET_GALLERY_PHOTOS, ("2023-06-15~", days[-1][0] + "~"), args.repeats
+            )
+            conn.close()
+
+        print(
+            f"{n} photos over {args.years} years, migration took {migration:.2f}s, "
+            f"day_summary rebuild {rebuild:.2f}s"
+        )
+        for (name, before, before_plan), (_, after, after_plan) in zip(legacy, migrated):
+            speedup = before / after
+            print(f"  {name:<14}{before:9.2f} ms -> {after:7.2f} ms  ({speedup:.0f}x)")
+            print(f"    before: {before_plan}")
+            print(f"    after:  {after_plan}")
+        print(f"  gallery page photos {page_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "streamlit_app"))
+import numpy as np
+from hybrid_search import hybrid_query
+from vector_store import LocalVectorStore
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(
+    description="Storylines hybrid search evaluation on logged learnings"
+)
+parser.add_argument("--learnings_db", type=str, default="./data/learnings.db")
+parser.add_argument("--backend", choices=["local", "pinecone"], default="local")
+parser.add_argument("--vectors_dir", type=str, default="./data/vectors")
+parser.add_argument("--uid", type=str, default=None, help="only evaluate this user")
+parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+parser.add_argument(
+    "--caption_weights", type=float, nargs="+", default=[0.0, 0.2, 0.3, 0.5, 0.7]
+)
+parser.add_argument("--method", choices=["weighted", "rrf"], default="weighted")
+
+
+def load_learnings(db_path, uid=None):
+    """(uid, journey, target id) of every learning the queue has upserted."""
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    query = "SELECT uid, journey, target_id FROM learnings WHERE status = 'done'"
+    params = ()
+    if uid is not None:
+        query += " AND uid = ?"
+        params = (uid,)
+    rows = connection.execute(query, params).fetchall()
+    connection.close()
+    return [(uid, json.loads(journey), target_id) for uid, journey, target_id in rows]
+
+
+def open_index(args):
+    if args.backend == "local":
+        return LocalVectorStore(args.vectors_dir, dim=512)
+    import pinecone
+    from dotenv import load_dotenv
+    from vector_store import PineconeVectorStore
+
+    load_dotenv()
+    pinecone.init(
+        api_key=os.getenv("PINECONE_API_KEY"),
+        environment=os.getenv("PINECONE_ENVIRONMENT"),
+    )
+    return PineconeVectorStore("photo-captions")
+
+
+def evaluate(index, learnings, embeddings, caption_weight, ks, method):
+    """Recall@k of the target image and per-query latency for one caption weight."""
+    top_k = max(ks)
+    # the search page queries both namespaces in parallel
+    executor = ThreadPoolExecutor(max_workers=2)
+    ranks = []
+    latencies = []
+    for (uid, _, target_id), vector in zip(learnings, embeddings):
+        start = time.perf_counter()
+        if caption_weight > 0:
+            matches = hybrid_query(
+                index,
+                vector,
+                uid,
+                top_k,
+                caption_weight=caption_weight,
+                executor=executor,
+                method=method,
+            )
+        else:
+            matches = index.query(
+                vector=vector, top_k=top_k, namespace=uid, include_metadata=False
+            )["matches"]
+        latencies.append(time.perf_counter() - start)
+        ids = [match["id"] for match in matches]
+        ranks.append(ids.index(target_id) if target_id in ids else top_k)
+    executor.shutdown()
+    ranks = np.array(ranks)
+    latencies = np.array(latencies) * 1000
+    recall = {k: float(np.mean(ranks < k)) for k in ks}
+    return recall, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    args = parser.parse_args()
+    learnings = load_learnings(args.learnings_db, args.uid)
+    if not learnings:
+        print(f"No completed learnings in {args.learnings_db}")
+        return
+    index = open_index(args)
+    stats = index.describe_index_stats()["namespaces"]
+    uids = {uid for uid, _, _ in learnings}
+    if not any(f"{uid}_captions" in stats for uid in uids):
+        print("No _captions namespace found, index images with captions first")
+
+    from sentence_transformers import SentenceTransformer
+
+    # the text tower the search page embeds journeys with
+    model = SentenceTransformer("clip-ViT-B-32")
+    queries = [", ".join(journey) for _, journey, _ in learnings]
+    embeddings = model.encode(queries, convert_to_numpy=True).tolist()
+
+    print(f"{len(learnings)} learnings from {len(uids)} users, {args.method} fusion")
+    header = "  ".join(f"recall@{k:<3}" for k in args.k)
+    print(f"{'caption weight':<16}{header}  p50 ms  p95 ms")
+    for caption_weight in args.caption_weights:
+        recall, p50, p95 = evaluate(
+            index, learnings, embeddings, caption_weight, args.k, args.method
+        )
+        name = "image only" if caption_weight == 0 else f"{caption_weight:.2f}"
+        values = "  ".join(f"{recall[k]:<10.3f}" for k in args.k)
+        print(f"{name:<16}{values}  {p50:6.1f}  {p95:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import numpy as np
+from bench_sql_queries import build_database
+from flask_app import create_app
+from sql_queries.day_summary import rebuild_day_summary
+from sql_queries.migrations import migrate
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines gallery load test")
+parser.add_argument("--db_path", type=str, default=None, help="synthetic if not given")
+parser.add_argument("--photos", type=int, default=50_000, help="size of the synthetic db")
+parser.add_argument("--threads", type=int, default=8)
+parser.add_argument("--requests", type=int, default=200, help="requests per thread")
+# (pool size, cache entries) per run, 0 disables either
+CONFIGURATIONS = [(0, 0), (8, 0), (8, 256)]
+
+
+def client_loop(app, n, latencies, errors):
+    """Scroll through the gallery: follow next_cursor, restart at the end."""
+    client = app.test_client()
+    cursor = None
+    for i in range(n):
+        query = {"cursor": cursor} if cursor else {}
+        start = time.perf_counter()
+        if i % 2:
+            response = client.get("/images", query_string=query)
+        else:
+            response = client.get("/api/images", query_string=query)
+            if response.status_code == 200:
+                cursor = response.get_json()["next_cursor"]
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+def run(db_path, pool_size, cache_entries, threads, requests):
+    app = create_app(
+        {
+            "DATABASE": db_path,
+            "DATABASE_POOL_SIZE": pool_size,
+            "DATABASE_CACHE_ENTRIES": cache_entries,
+        }
+    )
+    latencies = []
+    errors = []
+    workers = [
+        threading.Thread(target=client_loop, args=(app, requests, latencies, errors))
+        for _ in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - start
+    pool = app.extensions["sqlite_pool"]
+    pool.close()
+    return len(latencies) / seconds, np.array(latencies) * 1000, errors, pool.opened
+
+
+def main():
+    args = parser.parse_args()
+    tmp = None
+    db_path = args.db_path
+    if db_path is None:
+        tmp = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp.name, "photos.db")
+        conn = build_database(db_path, args.photos, years=3)
+        migrate(conn)
+        rebuild_day_summary(conn)
+        conn.close()
+        print(f"Synthetic database of {args.photos} photos")
+
+    print(f"{args.threads} threads x {args.requests} requests, /images and /api/images")
+    for pool_size, cache_entries in CONFIGURATIONS:
+        throughput, latencies, errors, opened = run(
+            db_path, pool_size, cache_entries, args.threads, args.requests
+        )
+        name = "connect per request" if pool_size == 0 else f"pool of {pool_size}"
+        if cache_entries:
+            name += " + cache"
+        print(
+            f"{name:<20} {throughput:7.0f} req/s  "
+            f"p50 {np.percentile(latencies, 50):6.2f} ms  "
+            f"p95 {np.percentile(latencies, 95):6.2f} ms  "
+            f"{opened} connections  {len(errors)} errors"
+        )
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from sql_queries.day_summary import rebuild_day_summary
+from sql_queries.migrations import migrate
+
+# ----------------------------------------------------------------------
+# Parameters
+parser = argparse.ArgumentParser(description="Storylines DB migration")
+parser.add_argument("--db_path", type=str, default="photos.db")
+
+
+def main():
+    args = parser.parse_args()
+    if not os.path.exists(args.db_path):
+        print(f"Error: {args.db_path} does not exist")
+        sys.exit(1)
+    with sqlite3.connect(args.db_path) as conn:
+        applied = migrate(conn)
+        # also the way to refresh the gallery after copied or the tags change
+        days = rebuild_day_summary(conn)
+    conn.close()
+    if applied:
+        print(f"Added {', '.join(applied)}")
+    else:
+        print(f"{args.db_path} is up to date")
+    if days is not None:
+        print(f"Rebuilt day_summary, {days} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import argparse
 import sys
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from PIL import Image
+from sql_queries.day_summary import rebuild_day_summary
+from sql_queries.migrations import migrate, normalize_date_taken
 from sql_queries.queries import CREATE_PHOTOS_TABLE
 import sqlite3
 import sys
@@ -15,6 +19,11 @@ DATE_TIME_EXIF_TAG = 0x9003
 parser = argparse.ArgumentParser(description="Storylines DB Populator")
 parser.add_argument("--album_path", type=str)
 parser.add_argument("--db_path", type=str, default="photos.db")
+parser.add_argument(
+    "--workers", type=int, default=os.cpu_count() or 1, help="1 reads the images in-process"
+)
+parser.add_argument("--batch_size", type=int, default=2000, help="rows per transaction")
+parser.add_argument("--chunksize", type=int, default=64, help="images per worker task")
 
 
 class DatabaseEntry:
@@ -29,6 +38,10 @@ class DatabaseEntry:
                 self.width = width
                 self.height = height
                 self.taken_date = img._getexif().get(DATE_TIME_EXIF_TAG)
+                # EXIF dates are "YYYY:MM:DD HH:MM:SS", the queries read ISO TakenAt
+                self.taken_at, self.taken_year, self.taken_month = normalize_date_taken(
+                    self.taken_date
+                )
                 # self.exif_data = str(img._getexif())  # Fetching the EXIF data
                 self.peta_label = ""
                 self.user_label = ""
@@ -42,32 +55,64 @@ def create_database(conn):
 
     # SQL command to create a table with the specified schema, only if it doesn't already exist
     c.execute(CREATE_PHOTOS_TABLE)
+    # add the normalized date columns and indexes the queries rely on
+    applied = migrate(conn)
+    if applied:
+        print(f"populate_database.py:: migrated {', '.join(applied)}")
     # Commit the changes and close the connection
     conn.commit()
 
 
-def update_database(conn, entry):
-    c = conn.cursor()
-    # Upsert data into the database
-    c.execute(
-        """
-                INSERT OR REPLACE INTO photos (PhotoID, FilePath, FileName, FileSize, ImageWidth, ImageHeight, DateTaken, PETALabel, UserLabel)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-        (
-            entry.primary_key,
-            entry.file_path,
-            entry.file_name,
-            entry.file_size,
-            entry.width,
-            entry.height,
-            entry.taken_date,
-            # entry.exif_data,
-            entry.peta_label,
-            entry.user_label,
-        ),
+def entry_row(entry):
+    return (
+        entry.primary_key,
+        entry.file_path,
+        entry.file_name,
+        entry.file_size,
+        entry.width,
+        entry.height,
+        entry.taken_date,
+        entry.taken_at,
+        entry.taken_year,
+        entry.taken_month,
+        # entry.exif_data,
+        entry.peta_label,
+        entry.user_label,
     )
-    conn.commit()
+
+
+def extract_row(file_path):
+    """
+    Runs in the worker processes: open the image and read its size and EXIF.
+    Errors are returned as strings, some PIL exceptions do not pickle.
+
+    Return:
+        (file_path, photos row or None, error or None)
+    """
+    try:
+        return file_path, entry_row(DatabaseEntry(file_path)), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+def update_database(conn, rows):
+    """Upsert a batch of photos rows in one transaction."""
+    with conn:
+        conn.executemany(
+            """
+                INSERT OR REPLACE INTO photos (PhotoID, FilePath, FileName, FileSize, ImageWidth, ImageHeight, DateTaken, TakenAt, TakenYear, TakenMonth, PETALabel, UserLabel)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+            rows,
+        )
+
+
+def image_paths(root_directory):
+    for subdir, _, files in os.walk(root_directory):
+        for file in files:
+            # Only process image files
+            if file.lower().endswith((".jpg", ".heic", ".png")):
+                yield os.path.join(subdir, file)
 
 
 def main():
@@ -82,33 +127,59 @@ def main():
             sys.exit(1)
 
         create_database(conn)
-        # Get the total number of files for the progress bar
-        total_files = sum([len(files) for r, d, files in os.walk(root_directory)])
-        progress_bar = tqdm(total=total_files, desc="Processing images", unit="image")
+        # WAL lets the gallery keep reading while the batches commit
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        file_paths = list(image_paths(root_directory))
+        progress_bar = tqdm(total=len(file_paths), desc="Processing images", unit="image")
+
+        start = time.perf_counter()
+        executor = None
+        if args.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=args.workers)
+            # chunks amortize the round trip to the workers over many images
+            results = executor.map(extract_row, file_paths, chunksize=args.chunksize)
+        else:
+            results = map(extract_row, file_paths)
 
         failed_files = []
-        for subdir, _, files in os.walk(root_directory):
-            for file in files:
-                file_path = os.path.join(subdir, file)
-                # Only process image files
-                sRet = file_path.lower()
-                if sRet.endswith(".jpg") or sRet.endswith(".heic") or sRet.endswith(".png"):
-                    try:
-                        db_entry = DatabaseEntry(file_path)
-                        update_database(conn, db_entry)
-                    except ValueError as ve:
-                        failed_files.append((file_path, str(ve)))
-                    except Exception as e:
-                        print(e)
-                        failed_files.append((file_path, str(e)))
+        batch = []
+        inserted = 0
+        try:
+            for file_path, row, error in results:
+                if error is not None:
+                    failed_files.append((file_path, error))
+                else:
+                    batch.append(row)
+                if len(batch) >= args.batch_size:
+                    update_database(conn, batch)
+                    inserted += len(batch)
+                    batch = []
                 # update the progress bar
                 progress_bar.update()
+            if batch:
+                update_database(conn, batch)
+                inserted += len(batch)
+        finally:
+            if executor is not None:
+                # on a failure the workers stop instead of reading the rest
+                executor.shutdown(cancel_futures=True)
+        seconds = time.perf_counter() - start
 
         # Close the progress bar
         progress_bar.close()
+        # the gallery reads its days and tags from day_summary
+        days = rebuild_day_summary(conn)
+        if days is not None:
+            print(f"populate_database.py:: rebuilt day_summary, {days} days")
         for file, error in failed_files:
             print(f"{file}: {error}")
         print(f"Failed to process {len(failed_files)} files:")
+        print(
+            f"Inserted {inserted} photos in {seconds:.1f}s, "
+            f"{len(file_paths) / seconds if seconds else 0:.0f} images/s "
+            f"with {args.workers} workers"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+import argparse
+import json
+import time
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ----------------------------------------------------------------------
+# Local stand-in for the Google Photos mediaItems:search endpoint.
+# Every day holds items_per_day fake media items, pages are served with
+# nextPageToken exactly like the real API so listing code can be benchmarked
+# without credentials or quota.
+parser = argparse.ArgumentParser(description="Storylines Google Photos stub")
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--items_per_day", type=int, default=150)
+parser.add_argument("--latency_ms", type=float, default=50)
+
+
+def _to_date(d):
+    return date(d["year"], d["month"], d["day"])
+
+
+def fake_media_item(day, i):
+    media_id = f"stub-{day.isoformat()}-{i}"
+    return {
+        "id": media_id,
+        "productUrl": f"https://photos.google.com/lr/photo/{media_id}",
+        "baseUrl": f"http://stub/media/{media_id}",
+        "mimeType": "image/jpeg",
+        "mediaMetadata": {
+            "creationTime": f"{day.isoformat()}T{i % 24:02d}:{i % 60:02d}:00Z",
+            "width": "4032",
+            "height": "3024",
+            "photo": {},
+        },
+        "filename": f"IMG_{i:05d}.jpg",
+    }
+
+
+def make_handler(items_per_day, latency_ms):
+    class StubPhotosHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(latency_ms / 1000)
+
+            date_filter = body["filters"]["dateFilter"]
+            if "dates" in date_filter:
+                days = [_to_date(d) for d in date_filter["dates"]]
+            else:
+                days = []
+                for r in date_filter["ranges"]:
+                    day = _to_date(r["startDate"])
+                    while day <= _to_date(r["endDate"]):
+                        days.append(day)
+                        day += timedelta(days=1)
+
+            # the legacy client sends no pageSize, the API then defaults to 25
+            page_size = body.get("pageSize", 25)
+            offset = int(body.get("pageToken", 0))
+            total = len(days) * items_per_day
+            items = [
+                fake_media_item(days[n // items_per_day], n % items_per_day)
+                for n in range(offset, min(offset + page_size, total))
+            ]
+            response = {}
+            if items:
+                response["mediaItems"] = items
+            if offset + page_size < total:
+                response["nextPageToken"] = str(offset + page_size)
+
+            payload = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubPhotosHandler
+
+
+def serve(port=0, items_per_day=150, latency_ms=50):
+    """Start the stub in a daemon thread, returns (server, search_url)."""
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port), make_handler(items_per_day, latency_ms)
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    search_url = f"http://127.0.0.1:{server.server_port}/v1/mediaItems:search"
+    return server, search_url
+
+
+def main():
+    args = parser.parse_args()
+    server, search_url = serve(args.port, args.items_per_day, args.latency_ms)
+    print(f"Serving stub mediaItems:search on {search_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# day_summary.py
+import json
+
+from sql_queries.migrations import table_exists
+
+# One row per day of the gallery with its photo count and PETA tags, so a
+# gallery page reads its days and tags with one range over the primary key
+# instead of joining dates_have_tags and grouping the tags on every request.
+CREATE_DAY_SUMMARY_TABLE = """
+CREATE TABLE IF NOT EXISTS day_summary (
+date TEXT PRIMARY KEY NOT NULL,
+photo_count INTEGER NOT NULL,
+tags TEXT NOT NULL DEFAULT '[]'
+) WITHOUT ROWID
+"""
+
+# tags is a JSON array, in the order the tags were added to the date
+REBUILD_DAY_SUMMARY = """
+INSERT INTO day_summary (date, photo_count, tags)
+SELECT days.date, days.photo_count, COALESCE(day_tags.tags, '[]')
+FROM (
+    SELECT SUBSTR(TakenAt, 1, 10) AS date, COUNT(DISTINCT FileName) AS photo_count
+    FROM copied
+    WHERE TakenAt IS NOT NULL
+    GROUP BY 1
+) AS days
+LEFT JOIN (
+    SELECT date, json_group_array(tag) AS tags
+    FROM (
+        SELECT dates_have_tags.date, PETA_tags.tag
+        FROM dates_have_tags
+        JOIN PETA_tags ON dates_have_tags.tag_id = PETA_tags.id
+        ORDER BY dates_have_tags.date, dates_have_tags.rowid
+    )
+    GROUP BY date
+) AS day_tags ON day_tags.date = days.date
+"""
+
+# What the summary was built from, to tell when copied or the tags changed
+CREATE_DAY_SUMMARY_SOURCE_TABLE = """
+CREATE TABLE IF NOT EXISTS day_summary_source (
+id INTEGER PRIMARY KEY CHECK (id = 0),
+source TEXT NOT NULL
+)
+"""
+
+# the same without the tag tables, for databases that were never tagged
+REBUILD_DAY_SUMMARY_WITHOUT_TAGS = """
+INSERT INTO day_summary (date, photo_count)
+SELECT SUBSTR(TakenAt, 1, 10), COUNT(DISTINCT FileName)
+FROM copied
+WHERE TakenAt IS NOT NULL
+GROUP BY 1
+"""
+
+
+def _tagged(conn):
+    return table_exists(conn, "dates_have_tags") and table_exists(conn, "PETA_tags")
+
+
+def summary_source(conn, tagged):
+    """
+    Row count and largest rowid of copied and of dates_have_tags. Inserts and
+    deletes change it, so it tells when day_summary is out of date.
+    """
+    tables = ("copied", "dates_have_tags") if tagged else ("copied",)
+    return json.dumps(
+        [
+            conn.execute(f"SELECT COUNT(*), MAX(rowid) FROM {table}").fetchone()
+            for table in tables
+        ]
+    )
+
+
+def day_summary_is_stale(conn):
+    """True when day_summary is missing or copied or the tags changed since its rebuild."""
+    if not table_exists(conn, "day_summary_source"):
+        return True
+    row = conn.execute("SELECT source FROM day_summary_source").fetchone()
+    return row is None or row[0] != summary_source(conn, _tagged(conn))
+
+
+def rebuild_day_summary(conn):
+    """
+    Recompute day_summary from copied and the PETA tags in one transaction.
+    Run after copied or dates_have_tags change, readers see either the old
+    or the new summary.
+
+    Return:
+        number of days, None when there is no copied table to summarize
+    """
+    if not table_exists(conn, "copied"):
+        return None
+    tagged = _tagged(conn)
+    with conn:
+        conn.execute(CREATE_DAY_SUMMARY_TABLE)
+        conn.execute(CREATE_DAY_SUMMARY_SOURCE_TABLE)
+        conn.execute("DELETE FROM day_summary")
+        conn.execute(REBUILD_DAY_SUMMARY if tagged else REBUILD_DAY_SUMMARY_WITHOUT_TAGS)
+        conn.execute(
+            "INSERT OR REPLACE INTO day_summary_source (id, source) VALUES (0, ?)",
+            (summary_source(conn, tagged),),
+        )
+    return conn.execute("SELECT COUNT(*) FROM day_summary").fetchone()[0]
+
+
+def refresh_day_summary(conn):
+    """
+    rebuild_day_summary when day_summary is stale.
+
+    Return:
+        number of days when it was rebuilt, None otherwise
+    """
+    if not table_exists(conn, "copied") or not day_summary_is_stale(conn):
+        return None
+    return rebuild_day_summary(conn)
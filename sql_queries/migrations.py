@@ -0,0 +1,160 @@
+# migrations.py
+import re
+
+# DateTaken holds whatever the importer wrote, EXIF's "YYYY:MM:DD HH:MM:SS" for
+# populate_database.py. TakenAt is the same instant as ISO "YYYY-MM-DD HH:MM:SS",
+# NULL when DateTaken is not a date, so string order is time order and date
+# filters become ranges over an index.
+TAKEN_AT = """
+CASE WHEN {date} GLOB '[0-9][0-9][0-9][0-9][:-][0-9][0-9][:-][0-9][0-9]*'
+THEN REPLACE(SUBSTR({date}, 1, 10), ':', '-') || SUBSTR({date}, 11)
+END
+"""
+
+DATE_PATTERN = re.compile(r"\d{4}[:-]\d{2}[:-]\d{2}")
+
+
+def normalize_date_taken(date_taken):
+    """
+    TAKEN_AT in Python, for writers that fill the date columns themselves.
+
+    Return:
+        (TakenAt, TakenYear, TakenMonth), all None when date_taken is not a date
+    """
+    if not isinstance(date_taken, str) or not DATE_PATTERN.match(date_taken):
+        return None, None, None
+    taken_at = date_taken[:10].replace(":", "-") + date_taken[10:]
+    return taken_at, int(taken_at[:4]), int(taken_at[5:7])
+
+
+DATE_COLUMNS = {"TakenAt": "TEXT", "TakenYear": "INTEGER", "TakenMonth": "INTEGER"}
+
+# Triggers keep the columns in step with DateTaken, so writers that only set
+# DateTaken keep working. A writer that fills in all three columns itself
+# skips the extra update.
+# (Virtual generated columns would need no triggers, but SQLite does not read
+# them from an index, so the indexes below could not cover the queries.)
+SET_DATE_COLUMNS = """
+UPDATE {table} SET
+TakenAt = {taken_at},
+TakenYear = CAST(SUBSTR({taken_at}, 1, 4) AS INTEGER),
+TakenMonth = CAST(SUBSTR({taken_at}, 6, 2) AS INTEGER)
+"""
+
+CREATE_DATE_TRIGGERS = [
+    """
+CREATE TRIGGER IF NOT EXISTS {table}_taken_at_insert
+AFTER INSERT ON {table} WHEN NEW.TakenAt IS NULL AND NEW.DateTaken IS NOT NULL
+BEGIN
+{set_columns} WHERE rowid = NEW.rowid;
+END
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS {table}_taken_at_update
+AFTER UPDATE OF DateTaken ON {table}
+BEGIN
+{set_columns} WHERE rowid = NEW.rowid;
+END
+""",
+]
+
+# dates_have_tags.date is the day of the tags, written in DateTaken's EXIF form
+# by the tagger. Rewritten to TakenAt's ISO day so it joins the gallery days.
+EXIF_DAY = "'[0-9][0-9][0-9][0-9]:[0-9][0-9]:[0-9][0-9]*'"
+
+SET_TAG_DATE = """
+UPDATE dates_have_tags SET date = SUBSTR({taken_at}, 1, 10)
+WHERE {where}
+"""
+
+CREATE_TAG_DATE_TRIGGERS = [
+    """
+CREATE TRIGGER IF NOT EXISTS dates_have_tags_date_insert
+AFTER INSERT ON dates_have_tags WHEN NEW.date GLOB {exif_day}
+BEGIN
+{set_date};
+END
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS dates_have_tags_date_update
+AFTER UPDATE OF date ON dates_have_tags WHEN NEW.date GLOB {exif_day}
+BEGIN
+{set_date};
+END
+""",
+]
+
+# Covering indexes: the gallery and by-date queries read only these columns
+INDEXES = [
+    ("photos", "photos_taken_at", "TakenAt, FileName, ImageWidth, ImageHeight"),
+    ("copied", "copied_taken_at", "TakenAt, FileName, ImageWidth, ImageHeight"),
+    ("dates_have_tags", "dates_have_tags_date", "date, tag_id"),
+]
+
+
+def table_exists(conn, table):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+def migrate(conn):
+    """
+    Add the normalized date columns and the date indexes to the tables of conn
+    that exist, backfill them, and rewrite the tag dates still in EXIF form.
+    Safe to run on every start-up, already migrated tables are left alone.
+
+    Return:
+        list of the columns and indexes that were added
+    """
+    applied = []
+    with conn:
+        for table in ("photos", "copied"):
+            if not table_exists(conn, table):
+                continue
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            missing = [column for column in DATE_COLUMNS if column not in existing]
+            for column in missing:
+                conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {column} {DATE_COLUMNS[column]}"
+                )
+                applied.append(f"{table}.{column}")
+            if missing:
+                # backfill the rows written before the migration
+                conn.execute(
+                    SET_DATE_COLUMNS.format(
+                        table=table, taken_at=TAKEN_AT.format(date="DateTaken")
+                    )
+                )
+            set_columns = SET_DATE_COLUMNS.format(
+                table=table, taken_at=TAKEN_AT.format(date="NEW.DateTaken")
+            )
+            for trigger in CREATE_DATE_TRIGGERS:
+                conn.execute(trigger.format(table=table, set_columns=set_columns))
+        if table_exists(conn, "dates_have_tags"):
+            # the dates written before the triggers existed
+            updated = conn.execute(
+                SET_TAG_DATE.format(
+                    taken_at=TAKEN_AT.format(date="date"), where=f"date GLOB {EXIF_DAY}"
+                )
+            ).rowcount
+            if updated:
+                applied.append(f"dates_have_tags.date ({updated} rows)")
+            set_date = SET_TAG_DATE.format(
+                taken_at=TAKEN_AT.format(date="NEW.date"), where="rowid = NEW.rowid"
+            )
+            for trigger in CREATE_TAG_DATE_TRIGGERS:
+                conn.execute(trigger.format(exif_day=EXIF_DAY, set_date=set_date))
+        for table, name, columns in INDEXES:
+            if not table_exists(conn, table):
+                continue
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)
+            ).fetchone()
+            if exists is None:
+                conn.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+                applied.append(name)
+    if applied:
+        conn.execute("ANALYZE")
+    return applied
@@ -1,16 +1,45 @@
 # queries.py
+# Date filters are ranges over TakenAt (see migrations.py). Every TakenAt of a
+# day sorts between "YYYY-MM-DD" and "YYYY-MM-DD~", so the day is a range scan.
 GET_PHOTO_BY_DATE = """
-SELECT DISTINCT FileName FROM copied WHERE SUBSTR(DateTaken, 1, 10) = ?
+SELECT DISTINCT FileName FROM copied WHERE TakenAt >= ?1 AND TakenAt < ?1 || '~'
 """
 
 GET_ALL_PHOTOS = "SELECT * FROM photos"
 
 GET_2023_PHOTOS = """
-SELECT DISTINCT FileName, ImageWidth, ImageHeight, DateTaken
+SELECT DISTINCT FileName, ImageWidth, ImageHeight, TakenAt
 FROM copied
-WHERE DateTaken IS NOT NULL
-AND SUBSTR(DateTaken, 1, 4) = '2023'
-ORDER BY DateTaken
+WHERE TakenAt >= '2023-01-01' AND TakenAt < '2024-01-01'
+ORDER BY TakenAt
+"""
+
+# Keyset pagination of the gallery, "date > day || '~'" starts after the day.
+# day_summary is kept by sql_queries/day_summary.py.
+GET_DAY_SUMMARIES = """
+SELECT date, photo_count, tags
+FROM day_summary
+WHERE date > ? AND date < ?
+ORDER BY date
+LIMIT ?
+"""
+
+# The same days straight from copied, without tags, while there is no
+# day_summary (a read-only database that was never migrated)
+GET_DAY_SUMMARIES_FROM_COPIED = """
+SELECT SUBSTR(TakenAt, 1, 10) AS date, COUNT(DISTINCT FileName), '[]'
+FROM copied
+WHERE TakenAt > ? AND TakenAt < ?
+GROUP BY 1
+ORDER BY 1
+LIMIT ?
+"""
+
+GET_GALLERY_PHOTOS = """
+SELECT DISTINCT FileName, ImageWidth, ImageHeight, TakenAt
+FROM copied
+WHERE TakenAt > ? AND TakenAt < ?
+ORDER BY TakenAt
 """
 
 GET_DATE_TAGS = """
@@ -0,0 +1,157 @@
+import numpy as np
+
+# Rows are assigned to centroids this many at a time to bound temporary memory
+_BLOCK = 65536
+
+
+def _to_float32(matrix):
+    return matrix if matrix.dtype == np.float32 else matrix.astype(np.float32)
+
+
+def _nearest_centroid(vectors, centroids):
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _BLOCK):
+        block = _to_float32(vectors[start : start + _BLOCK])
+        assignment[start : start + _BLOCK] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def spherical_kmeans(vectors, nlist, iterations=10, seed=0):
+    """k-means on unit vectors using cosine similarity, returns unit centroids."""
+    rng = np.random.default_rng(seed)
+    vectors = _to_float32(vectors)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_centroid(vectors, centroids)
+        counts = np.bincount(assignment, minlength=nlist)
+        # sum each bucket's vectors in one pass over the vectors sorted by bucket
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts[nonempty])[:-1]])
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(
+            vectors[np.argsort(assignment, kind="stable")], starts, axis=0
+        )
+        # re-seed empty lists with random points so every list stays useful
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms == 0, 1, norms)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted file index over the rows of a namespace matrix.
+
+    Rows are bucketed by their nearest k-means centroid. A query scans only the
+    rows of its nprobe closest buckets and reranks them exactly, trading a
+    little recall for scanning roughly nprobe / nlist of the matrix. New rows
+    are assigned to a bucket as they are inserted; the centroids are retrained
+    once the namespace has grown retrain_growth times since the last training.
+    """
+
+    def __init__(self, nlist=None, nprobe=8, min_train_rows=10000, retrain_growth=4, seed=0):
+        """
+        Args:
+            nlist: number of buckets, defaults to 4 * sqrt(rows) at training time
+            nprobe: buckets scanned per query, the recall/latency knob
+            min_train_rows: below this many rows queries stay exact
+            retrain_growth: retrain when rows exceed this multiple of the trained size
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_rows = min_train_rows
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self.centroids = None
+        self.trained_rows = 0
+        self.assignment = np.empty(0, dtype=np.int32)
+        self._lists = None
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _reserve(self, count):
+        if count > len(self.assignment):
+            assignment = np.full(max(count, 2 * len(self.assignment)), -1, dtype=np.int32)
+            assignment[: len(self.assignment)] = self.assignment
+            self.assignment = assignment
+
+    def train(self, matrix):
+        rows = len(matrix)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(rows)))
+        # 64 points per centroid is plenty to place it
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(rows, 64 * nlist)
+        sample = matrix[np.sort(rng.choice(rows, sample_size, replace=False))]
+        self.centroids = spherical_kmeans(sample, nlist, seed=self.seed)
+        self.trained_rows = rows
+        self._reserve(rows)
+        self.assignment[:rows] = _nearest_centroid(matrix, self.centroids)
+        self._lists = None
+
+    def maybe_train(self, matrix):
+        rows = len(matrix)
+        if rows < self.min_train_rows:
+            return
+        if not self.is_trained or rows > self.retrain_growth * self.trained_rows:
+            self.train(matrix)
+
+    def add(self, rows, vectors):
+        """Assign new or updated rows to their nearest bucket."""
+        if not self.is_trained:
+            return
+        rows = np.asarray(rows)
+        self._reserve(int(rows.max()) + 1)
+        self.assignment[rows] = _nearest_centroid(vectors, self.centroids)
+        self._lists = None
+
+    def move(self, source, target):
+        """Row source was moved to row target (deletes keep the matrix contiguous)."""
+        if self.is_trained:
+            self.assignment[target] = self.assignment[source]
+            self.assignment[source] = -1
+            self._lists = None
+
+    def remove(self, row):
+        if self.is_trained:
+            self.assignment[row] = -1
+            self._lists = None
+
+    def _build_lists(self, count):
+        assignment = self.assignment[:count]
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assignment[order], np.arange(len(self.centroids) + 1))
+        self._lists = (order, offsets)
+
+    def candidates(self, query, count, nprobe=None):
+        """Rows in the nprobe buckets closest to query."""
+        if self._lists is None or len(self._lists[0]) != count:
+            self._build_lists(count)
+        order, offsets = self._lists
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([order[offsets[c] : offsets[c + 1]] for c in probe])
+
+    def save(self, path, count):
+        np.savez(
+            path,
+            centroids=self.centroids,
+            assignment=self.assignment[:count],
+            trained_rows=self.trained_rows,
+        )
+
+    def load(self, path, count):
+        """
+        Load a saved index of a count row namespace. Returns False and stays
+        untrained when the file was saved for a different number of rows.
+        """
+        saved = np.load(path)
+        if len(saved["assignment"]) != count:
+            return False
+        self.centroids = saved["centroids"]
+        self.assignment = saved["assignment"].copy()
+        self.trained_rows = int(saved["trained_rows"])
+        self._lists = None
+        return True
@@ -0,0 +1,62 @@
+import time
+
+import torch
+
+from caption_store import CAPTION_MODEL_NAME
+from clip_embedding import preprocess
+
+# BLIP large input resolution
+BLIP_INPUT_SIZE = 384
+
+
+class BatchedCaptioner:
+    """
+    Batched BLIP captioning, run on images the ingestion pipeline has already
+    downloaded. Calling the captioner returns one caption per image, None for
+    images that were missing or failed to preprocess.
+    """
+
+    def __init__(self, processor, model, batch_size=16, max_new_tokens=30):
+        """
+        Args:
+            processor, model: BlipProcessor and BlipForConditionalGeneration
+            batch_size: images per generate call
+            max_new_tokens: caption length limit
+        """
+        self.processor = processor
+        self.model = model
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.images_captioned = 0
+        self.seconds = 0.0
+
+    @classmethod
+    def from_pretrained(cls, model_name=CAPTION_MODEL_NAME, **kwargs):
+        from transformers import BlipForConditionalGeneration, BlipProcessor
+
+        processor = BlipProcessor.from_pretrained(model_name)
+        model = BlipForConditionalGeneration.from_pretrained(model_name).eval()
+        return cls(processor, model, **kwargs)
+
+    def __call__(self, images):
+        start = time.perf_counter()
+        prepared = [preprocess(image, BLIP_INPUT_SIZE) for image in images]
+        captions = [None] * len(images)
+        valid = [i for i, image in enumerate(prepared) if image is not None]
+        for offset in range(0, len(valid), self.batch_size):
+            rows = valid[offset : offset + self.batch_size]
+            inputs = self.processor(
+                images=[prepared[i] for i in rows], return_tensors="pt"
+            )
+            with torch.inference_mode():
+                output = self.model.generate(**inputs, max_new_tokens=self.max_new_tokens)
+            for i, caption in zip(
+                rows, self.processor.batch_decode(output, skip_special_tokens=True)
+            ):
+                captions[i] = caption.strip()
+        self.images_captioned += len(valid)
+        self.seconds += time.perf_counter() - start
+        return captions
+
+    def images_per_second(self):
+        return self.images_captioned / self.seconds if self.seconds else 0.0
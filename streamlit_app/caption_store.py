@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import threading
+
+# The captioning model the search page uses through the inference API
+CAPTION_MODEL_NAME = "Salesforce/blip-image-captioning-large"
+
+CREATE_CAPTIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS captions (
+    media_id TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    caption TEXT NOT NULL,
+    PRIMARY KEY (media_id, model_name)
+)
+"""
+
+
+class CaptionStore:
+    """
+    Image captions keyed by media item id and captioning model.
+
+    Media item ids are immutable, so a caption generated at ingestion stays
+    valid after the item's baseUrl has expired. An empty caption records that
+    the model failed on the item, so it is not captioned again.
+    """
+
+    def __init__(self, db_path, model_name):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.model_name = model_name
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute(CREATE_CAPTIONS_TABLE)
+
+    def get(self, media_id):
+        return self.get_many([media_id]).get(media_id)
+
+    def get_many(self, ids):
+        """Captions of the ids that have one, as a dict."""
+        ids = list(ids)
+        captions = {}
+        with self.lock:
+            # stay under SQLite's limit on bound parameters
+            for start in range(0, len(ids), 500):
+                chunk = ids[start : start + 500]
+                rows = self.connection.execute(
+                    "SELECT media_id, caption FROM captions WHERE model_name = ? "
+                    f"AND media_id IN ({', '.join('?' * len(chunk))})",
+                    [self.model_name, *chunk],
+                ).fetchall()
+                captions.update(rows)
+        return captions
+
+    def put_many(self, captions):
+        """Store a dict of media id -> caption."""
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO captions (media_id, model_name, caption) "
+                "VALUES (?, ?, ?)",
+                [(media_id, self.model_name, caption) for media_id, caption in captions.items()],
+            )
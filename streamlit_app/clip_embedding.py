@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+
+# CLIP ViT-B/32 input resolution
+CLIP_INPUT_SIZE = 224
+
+
+def preprocess(image, size=CLIP_INPUT_SIZE):
+    """
+    Cheap CPU work done before the CLIP processor: convert to RGB and shrink
+    to the model's input size. ImagePipeline already decodes JPEGs at reduced
+    size (draft mode), so this resize is usually small.
+    Returns None when the image is missing or cannot be read.
+    """
+    if image is None:
+        return None
+    try:
+        image = image.convert("RGB")
+        scale = size / min(image.size)
+        if scale < 1:
+            image = image.resize(
+                (round(image.width * scale), round(image.height * scale)),
+                Image.BICUBIC,
+            )
+        return image
+    except Exception as e:
+        print(f"Error preprocessing image, error: {e}")
+        return None
+
+
+class BatchedEmbedder:
+    """
+    Batched CLIP image embedding for CPU hosts.
+
+    Images are preprocessed in a thread pool, then encoded batch_size at a time
+    under torch.inference_mode. Calling the embedder returns the embeddings and
+    a mask that is False for images that were missing or failed to preprocess.
+    """
+
+    def __init__(self, model, batch_size=64, preprocess_workers=4, num_threads=None):
+        """
+        Args:
+            model: a SentenceTransformer CLIP model
+            batch_size: images per forward pass
+            preprocess_workers: threads used to preprocess images
+            num_threads: torch intra-op threads, a process-wide setting, left
+                at torch's default (the number of cores) when None
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.preprocess_executor = ThreadPoolExecutor(max_workers=preprocess_workers)
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        self.dim = model.get_sentence_embedding_dimension() or 512
+        self.images_embedded = 0
+        self.seconds = 0.0
+
+    def __call__(self, images):
+        """
+        Args:
+            images: list of PIL images, None for items that failed upstream
+        Return:
+            embeddings: float32 array of shape (len(images), dim), zero rows where mask is False
+            mask: bool array, True where the image was embedded
+        """
+        start = time.perf_counter()
+        prepared = list(self.preprocess_executor.map(preprocess, images))
+        mask = np.array([image is not None for image in prepared], dtype=bool)
+        embeddings = np.zeros((len(images), self.dim), dtype=np.float32)
+
+        valid = [image for image in prepared if image is not None]
+        if valid:
+            with torch.inference_mode():
+                embeddings[mask] = self.model.encode(
+                    valid,
+                    batch_size=self.batch_size,
+                    convert_to_numpy=True,
+                    show_progress_bar=False,
+                )
+        self.images_embedded += len(valid)
+        self.seconds += time.perf_counter() - start
+        return embeddings, mask
+
+    def images_per_second(self):
+        return self.images_embedded / self.seconds if self.seconds else 0.0
@@ -0,0 +1,184 @@
+import re
+from datetime import date, timedelta
+
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [
+            ("january", "jan"),
+            ("february", "feb"),
+            ("march", "mar"),
+            ("april", "apr"),
+            ("may",),
+            ("june", "jun"),
+            ("july", "jul"),
+            ("august", "aug"),
+            ("september", "sep", "sept"),
+            ("october", "oct"),
+            ("november", "nov"),
+            ("december", "dec"),
+        ],
+        start=1,
+    )
+    for name in names
+}
+SEASONS = {
+    "spring": [3, 4, 5],
+    "summer": [6, 7, 8],
+    "fall": [9, 10, 11],
+    "autumn": [9, 10, 11],
+    "winter": [12, 1, 2],
+}
+
+# Month and season words that are also everyday words ("kids fall off bike",
+# "spring cleaning") only count as dates after one of _DATE_CUES or next to a year
+AMBIGUOUS = {"may", "march", "mar", "jan", "august", "fall", "spring"}
+_DATE_CUES = {"in", "during", "last"}
+# Seasons that run into the next year, "winter 2022" is December 2022 to February 2023
+YEAR_CROSSING_SEASONS = {"winter"}
+
+_PREPOSITIONS = r"in|from|during|of|on|last"
+_YEAR_PATTERN = r"\b(19[89]\d|20\d\d)\b"
+_YEAR = re.compile(rf"(?:\b(?:{_PREPOSITIONS})\s+)?{_YEAR_PATTERN}", re.IGNORECASE)
+_MONTH = re.compile(
+    rf"(?:\b({_PREPOSITIONS})\s+)?\b("
+    + "|".join(sorted(list(MONTHS) + list(SEASONS), key=len, reverse=True))
+    + r")\b",
+    re.IGNORECASE,
+)
+_YEAR_AFTER = re.compile(r"[\s,]*" + _YEAR_PATTERN)
+_YEAR_BEFORE = re.compile(_YEAR_PATTERN + r"[\s,]*$")
+
+
+def _season_range(season, year):
+    """First and last day of season starting in year."""
+    months = SEASONS[season]
+    end_year = year + (months[-1] < months[0])
+    last_day = date(end_year + months[-1] // 12, months[-1] % 12 + 1, 1) - timedelta(days=1)
+    return date(year, months[0], 1), last_day
+
+
+def parse_date_terms(text):
+    """
+    Split the date terms out of a search query.
+
+    "beach in june 2022" -> ("beach", [2022], [6], []). Seasons expand to
+    their months. Words like "may", "march" or "fall" are only read as dates
+    after "in", "during" or "last" or next to a year. A season that runs into
+    the next year, next to years, becomes a date range per year instead.
+
+    Return:
+        (query without its date terms, years, months, [(start, end), ...])
+    """
+    months = []
+    crossing = []
+
+    def month(match):
+        cue, word = match.group(1), match.group(2).lower()
+        near_year = _YEAR_AFTER.match(text, match.end()) or (
+            not cue and _YEAR_BEFORE.search(text, 0, match.start())
+        )
+        if word in AMBIGUOUS and not (near_year or (cue and cue.lower() in _DATE_CUES)):
+            return match.group(0)
+        if word in YEAR_CROSSING_SEASONS:
+            crossing.append(word)
+        else:
+            months.extend(SEASONS.get(word) or [MONTHS[word]])
+        return " "
+
+    text = _MONTH.sub(month, text)
+    years = [int(year) for year in _YEAR.findall(text)]
+    text = _YEAR.sub(" ", text)
+
+    ranges = []
+    if crossing and years:
+        # the years belong to the seasons, a year filter would cut them at New Year
+        ranges = [_season_range(season, year) for season in crossing for year in years]
+        years = []
+    else:
+        for season in crossing:
+            months.extend(SEASONS[season])
+    text = " ".join(text.split()).strip(" ,")
+    return text, years, months, ranges
+
+
+def journey_filter(search_journey):
+    """
+    Pull date terms out of every journey step. The latest step that mentions
+    years (or months) decides them, so "2021" in a refinement replaces an
+    earlier "2022". A season range ("winter 2022") replaces both, and is
+    replaced by later years.
+
+    Return:
+        (journey with date terms removed and empty steps dropped, filter or None)
+    """
+    steps = []
+    years = months = ranges = None
+    for step in search_journey:
+        text, step_years, step_months, step_ranges = parse_date_terms(step)
+        if text:
+            steps.append(text)
+        if step_ranges:
+            ranges, years, months = step_ranges, None, None
+        if step_years:
+            ranges = None
+        years = step_years or years
+        months = step_months or months
+    return steps, combine_filters(year_month_filter(years, months), ranges_filter(ranges))
+
+
+def year_month_filter(years=None, months=None):
+    """Metadata filter for any of years and any of months, None for neither."""
+    filter = {}
+    if years:
+        filter["year"] = {"$in": sorted(set(years))}
+    if months:
+        filter["month"] = {"$in": sorted(set(months))}
+    return filter or None
+
+
+def date_range_filter(start, end):
+    """
+    Metadata filter for start <= date <= end over the year, month and day
+    fields: the partial first and last months, whole years, and the whole
+    months left in between.
+    """
+    if start > end:
+        start, end = end, start
+    if (start.year, start.month) == (end.year, end.month):
+        return {
+            "year": start.year,
+            "month": start.month,
+            "day": {"$gte": start.day, "$lte": end.day},
+        }
+
+    terms = [{"year": start.year, "month": start.month, "day": {"$gte": start.day}}]
+    year, month = start.year + start.month // 12, start.month % 12 + 1
+    while (year, month) < (end.year, end.month):
+        if month == 1 and year < end.year:
+            terms.append({"year": year})
+            year += 1
+            continue
+        last_month = 12 if year < end.year else end.month - 1
+        terms.append({"year": year, "month": {"$in": list(range(month, last_month + 1))}})
+        year, month = (year + 1, 1) if last_month == 12 else (year, last_month + 1)
+    terms.append({"year": end.year, "month": end.month, "day": {"$lte": end.day}})
+    return {"$or": terms}
+
+
+def ranges_filter(ranges):
+    """Metadata filter for any of the (start, end) date ranges, None for none."""
+    if not ranges:
+        return None
+    filters = [date_range_filter(start, end) for start, end in ranges]
+    return filters[0] if len(filters) == 1 else {"$or": filters}
+
+
+def combine_filters(*filters):
+    """All of filters, skipping the empty ones. None if nothing is left."""
+    filters = [filter for filter in filters if filter]
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    return {"$and": filters}
@@ -0,0 +1,202 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent media id -> embedding cache for a single model.
+
+    Embeddings live in a memory-mapped float16 matrix next to a JSON index that
+    maps each Google Photos media item id to its row. Media item ids are
+    immutable, so a cached row stays valid for as long as the model does.
+    When the matrix grows past max_bytes the least recently used rows are
+    evicted.
+
+    Eviction writes the compacted matrix to a new generation file and only
+    then replaces the index, which names the generation it describes, so a
+    crash at any point leaves an index that matches its matrix.
+    """
+
+    def __init__(self, cache_dir, model_name, dim=512, max_bytes=256 * 2**20):
+        """
+        Args:
+            cache_dir: directory holding the cache files
+            model_name: model the embeddings come from, part of the cache key
+            dim: embedding dimension
+            max_bytes: size of the embedding matrix that triggers eviction
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.cache_dir = cache_dir
+        self.name = name
+        self.generation = 0
+        self.matrix_path = self._matrix_path(0)
+        self.index_path = os.path.join(cache_dir, f"{name}.json")
+        self.model_name = model_name
+        self.dim = dim
+        self.max_rows = max(1, max_bytes // (dim * 2))
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.rows = {}
+        self.last_used = []
+        self.clock = 0
+        self.matrix = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+            # indexes written before generations existed describe generation 0
+            self.generation = index.get("generation", 0)
+            self.matrix_path = self._matrix_path(self.generation)
+            if (
+                index["model_name"] == model_name
+                and index["dim"] == dim
+                and os.path.exists(self.matrix_path)
+            ):
+                self.rows = {media_id: row for row, media_id in enumerate(index["ids"])}
+                self.last_used = index["last_used"]
+                self.clock = index["clock"]
+                self.matrix = np.memmap(
+                    self.matrix_path, dtype=np.float16, mode="r+"
+                ).reshape(-1, dim)
+        self._remove_other_generations()
+
+    def _matrix_path(self, generation):
+        suffix = "f16" if generation == 0 else f"{generation}.f16"
+        return os.path.join(self.cache_dir, f"{self.name}.{suffix}")
+
+    def _remove_other_generations(self):
+        """Delete matrices left behind by an eviction that crashed or finished."""
+        pattern = re.compile(re.escape(self.name) + r"\.(\d+\.)?f16(\.tmp)?$")
+        for file_name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, file_name)
+            if pattern.match(file_name) and path != self.matrix_path:
+                os.remove(path)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _reserve(self, rows):
+        """Make sure the memory map can hold at least rows rows."""
+        capacity = 0 if self.matrix is None else self.matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        with open(self.matrix_path, "ab") as matrix_file:
+            matrix_file.truncate(new_capacity * self.dim * 2)
+        self.matrix = np.memmap(
+            self.matrix_path, dtype=np.float16, mode="r+"
+        ).reshape(-1, self.dim)
+
+    def get(self, ids):
+        """
+        Args:
+            ids: media item ids
+        Return:
+            vectors: float32 array of shape (len(ids), dim), zero rows on a miss
+            hits: bool array, True where the id was cached
+        """
+        with self.lock:
+            rows = np.array(
+                [self.rows.get(media_id, -1) for media_id in ids], dtype=np.int64
+            )
+            hits = rows >= 0
+            vectors = np.zeros((len(ids), self.dim), dtype=np.float32)
+            if hits.any():
+                vectors[hits] = self.matrix[rows[hits]]
+                self.clock += 1
+                for row in rows[hits]:
+                    self.last_used[row] = self.clock
+            self.hits += int(hits.sum())
+            self.misses += int((~hits).sum())
+            return vectors, hits
+
+    def put(self, ids, vectors):
+        """Store vectors (one row per id) and persist the index."""
+        vectors = np.asarray(vectors, dtype=np.float16).reshape(-1, self.dim)
+        with self.lock:
+            self.clock += 1
+            new_ids = [
+                media_id for media_id in dict.fromkeys(ids) if media_id not in self.rows
+            ]
+            self._reserve(len(self.rows) + len(new_ids))
+            for media_id in new_ids:
+                self.rows[media_id] = len(self.rows)
+                self.last_used.append(self.clock)
+            rows = np.array([self.rows[media_id] for media_id in ids], dtype=np.int64)
+            self.matrix[rows] = vectors
+            for row in rows:
+                self.last_used[row] = self.clock
+            if len(self.rows) > self.max_rows:
+                self._evict()
+            self._save()
+
+    def _evict(self):
+        """Keep the most recently used rows, compacting the matrix to 3/4 of max_rows."""
+        keep_count = max(1, self.max_rows * 3 // 4)
+        last_used = np.array(self.last_used)
+        ids = np.empty(len(self.rows), dtype=object)
+        for media_id, row in self.rows.items():
+            ids[row] = media_id
+        keep = np.sort(np.argsort(-last_used, kind="stable")[:keep_count])
+        self.evictions += len(self.rows) - len(keep)
+
+        # the current matrix and index stay untouched until the new index,
+        # written by _save, points at the complete new matrix
+        old_path = self.matrix_path
+        self.generation += 1
+        self.matrix_path = self._matrix_path(self.generation)
+        tmp_path = self.matrix_path + ".tmp"
+        with open(tmp_path, "wb") as matrix_file:
+            matrix_file.write(np.ascontiguousarray(self.matrix[keep]).tobytes())
+            matrix_file.flush()
+            os.fsync(matrix_file.fileno())
+        os.replace(tmp_path, self.matrix_path)
+        del self.matrix
+        self.matrix = np.memmap(
+            self.matrix_path, dtype=np.float16, mode="r+"
+        ).reshape(-1, self.dim)
+        self.rows = {media_id: row for row, media_id in enumerate(ids[keep])}
+        self.last_used = last_used[keep].tolist()
+        self._save()
+        os.remove(old_path)
+
+    def _save(self):
+        self.matrix.flush()
+        ids = [None] * len(self.rows)
+        for media_id, row in self.rows.items():
+            ids[row] = media_id
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as index_file:
+            json.dump(
+                {
+                    "model_name": self.model_name,
+                    "dim": self.dim,
+                    "generation": self.generation,
+                    "ids": ids,
+                    "last_used": self.last_used,
+                    "clock": self.clock,
+                },
+                index_file,
+            )
+        os.replace(tmp_path, self.index_path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self.rows),
+            "bytes": len(self.rows) * self.dim * 2,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,81 @@
+import threading
+import time
+
+
+class _Done:
+    """Stands in for the ApplyResult pinecone returns from async_req calls."""
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class FakeIndex:
+    """
+    In-memory stand-in for pinecone.Index, for running index code offline.
+
+    Like the hosted service, writes only show up in describe_index_stats after
+    visibility_delay seconds.
+    """
+
+    def __init__(self, visibility_delay=0.0):
+        self.visibility_delay = visibility_delay
+        self.namespaces = {}
+        self.pending = []
+        self.stats_calls = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def _apply_visible(self):
+        now = time.monotonic()
+        while self.pending and self.pending[0][0] <= now:
+            _, apply = self.pending.pop(0)
+            apply()
+
+    def _write(self, apply):
+        with self.lock:
+            self.pending.append((time.monotonic() + self.visibility_delay, apply))
+            self._apply_visible()
+
+    def upsert(self, vectors, namespace="", async_req=False):
+        vectors = list(vectors)
+
+        def apply():
+            records = self.namespaces.setdefault(namespace, {})
+            for media_id, values, metadata in vectors:
+                records[media_id] = (values, metadata)
+
+        self._write(apply)
+        result = {"upserted_count": len(vectors)}
+        return _Done(result) if async_req else result
+
+    def delete(self, ids=None, delete_all=False, namespace=""):
+        def apply():
+            records = self.namespaces.setdefault(namespace, {})
+            if delete_all:
+                records.clear()
+            for media_id in ids or []:
+                records.pop(media_id, None)
+
+        self._write(apply)
+        return {}
+
+    def describe_index_stats(self):
+        with self.lock:
+            self.stats_calls += 1
+            self._apply_visible()
+            namespaces = {
+                name: {"vector_count": len(records)}
+                for name, records in self.namespaces.items()
+            }
+        return {
+            "namespaces": namespaces,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
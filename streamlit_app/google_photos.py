@@ -14,6 +14,12 @@ import pinecone
 import random
 import itertools
 
+from photos_listing import MediaItemLister
+from media_items import normalize_media_items
+from media_catalog import MediaCatalog
+from image_pipeline import embed_media_items_df
+from index_readiness import wait_for_namespace
+
 
 class GooglePhotosApi:
     def __init__(
@@ -103,9 +109,9 @@ class GooglePhotosApi:
             with open(self.cred_pickle_file, "wb") as token:
                 pickle.dump(self.cred, token)
 
-    # Populate class' media_items_df with Photos in the date range specified
+    # Populate class' catalog with Photos in the date range specified
     #
-    # Fields of note in the data frame:
+    # Fields of note in the catalog:
     # **id** Immutable
     # **baseUrl** Base URLs within the Google Photos Library API allow
     #  you to access the bytes of the media items. They are valid for 60 minutes.
@@ -113,160 +119,62 @@ class GooglePhotosApi:
     def get_embed_and_upsert_photos(
         self, img_model, index_name, sdate=date(2023, 2, 1), edate=date(2023, 4, 1)
     ):
-        # create a list with all dates between start date and end date
-        # edate = date.today()
-        date_list = pd.date_range(sdate, edate - timedelta(days=1), freq="d")
-
-        self.media_items_df = pd.DataFrame()
+        self.catalog = None
 
         self.media_items_pickle_file = (
             f"./data/media_items_{self.uid}.pickle"
         )
         if os.path.exists(self.media_items_pickle_file):
-            with open(self.media_items_pickle_file, "rb") as items_df:
-                self.media_items_df = pickle.load(items_df)
-            print(f"{len(self.media_items_df)} images sourced from pickle file")
+            with open(self.media_items_pickle_file, "rb") as catalog_file:
+                self.catalog = pickle.load(catalog_file)
+            if isinstance(self.catalog, pd.DataFrame):
+                # pickles written before the catalog hold the data frame
+                self.catalog = MediaCatalog.from_frame(self.catalog)
+            print(f"{len(self.catalog)} images sourced from pickle file")
         else:
             print(f"google_photos.py:: Fetching images from Google Photos API")
-            for date in date_list:
-                # get a list with all media items for specified date (year, month, day)
-                items_df, self.media_items_df = self.list_of_media_items(
-                    year=date.year,
-                    month=date.month,
-                    day=date.day,
-                    media_items_df=self.media_items_df,
-                )
-            num_images = len(self.media_items_df)
+            lister = MediaItemLister(self.cred.token)
+            media_items_df = normalize_media_items(lister.stream(sdate, edate))
+            num_images = len(media_items_df)
             print(f"google_photos.py:: {num_images} images captured")
             if num_images == 0:
                 return False
 
-            # Build metadata in the data frame
-            print(f"google_photos.py:: Building metadata in the data frame")
-            self.media_items_df.drop(
-                ["productUrl", "mimeType", "filename"], axis=1, inplace=True
-            )
-            self.media_items_df["year"] = [
-                int(x) for x in self.media_items_df["creationTime"].str[0:4].values
-            ]
-            self.media_items_df["month"] = [
-                int(x) for x in self.media_items_df["creationTime"].str[5:7].values
-            ]
-            self.media_items_df["day"] = [
-                int(x) for x in self.media_items_df["creationTime"].str[8:10].values
-            ]
-            self.media_items_df.reset_index(drop=True, inplace=True)
-
-            # Load images into memory so we can embed
-            print(f"google_photos.py:: Loading images into memory")
-            url_list = self.media_items_df["baseUrl"].values.tolist()
-            images = []
-            errored = []
-            images_pickle_file = f"./data/images_{self.uid}_{sdate}_{edate}.pickle"
-
-            if os.path.exists(images_pickle_file):
-                with open(images_pickle_file, "rb") as images_file:
-                    images = pickle.load(images_file)
-                print(f"{len(images)} images sourced from pickle file")
-            else:
-                for i in url_list:
-                    try:
-                        images.append(Image.open(requests.get(i, stream=True).raw))
-                    except:
-                        images.append(
-                            Image.open(requests.get(url_list[0], stream=True).raw)
-                        )
-                        errored.append(i)
-                        print("Image error")
-
-                with open(images_pickle_file, "wb") as images_file:
-                    pickle.dump(images, images_file)
-
-            # Embed images
+            # Download, decode and embed images in a bounded pipeline
             print(f"google_photos.py:: Embedding images")
-            embeddings = img_model.encode(images)
-            img_embeddings = []
-            for i, embedding in enumerate(embeddings):
-                img_embeddings.append(embedding.tolist())
+            media_items_df, failed = embed_media_items_df(
+                media_items_df, img_model.encode
+            )
+            print(f"google_photos.py:: {len(failed)} images failed to load")
+            if len(media_items_df) == 0:
+                return False
 
-            self.media_items_df["vector"] = img_embeddings
-            self.media_items_df["metadata"] = self.media_items_df.loc[
-                :, ["year", "month", "day"]
-            ].to_dict("records")
-            print(f"google_photos.py:: {self.media_items_df.head()}")
+            self.catalog = MediaCatalog.from_frame(media_items_df)
+            print(f"google_photos.py:: {self.catalog.to_frame().head()}")
 
             self.upsert_to_pinecone(index_name)
 
-            with open(self.media_items_pickle_file, "wb") as items_df:
-                pickle.dump(self.media_items_df, items_df)
+            with open(self.media_items_pickle_file, "wb") as catalog_file:
+                pickle.dump(self.catalog, catalog_file)
 
             print(
-                f"google_photos.py:: {len(self.media_items_df)} images fetched from Google Photos API"
+                f"google_photos.py:: {len(self.catalog)} images fetched from Google Photos API"
             )
         return True
 
-    def list_of_media_items(self, year, month, day, media_items_df):
-        """
-        Args:
-            year, month, day: day for the filter of the API call
-            self.media_items_df: existing data frame with all find media items so far
-        Return:
-            media_items_df: media items data frame extended by the articles found for the specified tag
-            items_df: media items uploaded on specified date
-        """
-
-        items_list_df = pd.DataFrame()
-
-        # create request for specified date
-        response = self.get_response_from_medium_api(year, month, day)
-
-        try:
-            for item in response.json()["mediaItems"]:
-                items_df = pd.DataFrame(item)
-                items_df = items_df.rename(columns={"mediaMetadata": "creationTime"})
-                items_df.set_index("creationTime")
-                items_df = items_df[items_df.index == "creationTime"]
-
-                # append the existing media_items data frame
-                items_list_df = pd.concat([items_list_df, items_df])
-                media_items_df = pd.concat([media_items_df, items_df])
-
-        except:
-            print(response.text)
-
-        return (items_list_df, media_items_df)
-
-    def get_response_from_medium_api(self, year, month, day):
-        url = "https://photoslibrary.googleapis.com/v1/mediaItems:search"
-        payload = {
-            "filters": {
-                "dateFilter": {"dates": [{"day": day, "month": month, "year": year}]}
-            }
-        }
-        headers = {
-            "content-type": "application/json",
-            "Authorization": "Bearer {}".format(self.cred.token),
-        }
-
-        try:
-            res = requests.request(
-                "POST", url, data=json.dumps(payload), headers=headers
-            )
-        except:
-            print("Request error")
-
-        return res
-
     def upsert_to_pinecone(self, index_name):
         print(f"google_photos.py:: Upserting to Pinecone")
         # vector dimenstions
-        vdim = len(self.media_items_df["vector"][0])
+        vdim = self.catalog.vectors.shape[1]
         print(f"{vdim} dimentions in each vector")
 
         vectors = zip(
-            self.media_items_df.id,
-            self.media_items_df.vector,
-            self.media_items_df.metadata,
+            self.catalog.ids,
+            self.catalog.vectors.astype("float32").tolist(),
+            [
+                {"year": item["year"], "month": item["month"], "day": item["day"]}
+                for item in self.catalog.metadata()
+            ],
         )
 
         # Upsert data with 100 vectors per upsert request asynchronously
@@ -283,25 +191,11 @@ class GooglePhotosApi:
             # Wait for and retrieve responses (this raises in case of error)
             [async_result.get() for async_result in async_results]
 
-        while index.describe_index_stats()["total_vector_count"] == 0:
-            print(index.describe_index_stats())
-
-    # Load images into memory, returns list of images loaded
-    def load_images_in_mem(self):
-        url_list = self.media_items_df["baseUrl"].values.tolist()
-        self.images = []
-        errored = []
-        for i in url_list:
-            try:
-                self.images.append(Image.open(requests.get(i, stream=True).raw))
-            except:
-                self.images.append(
-                    Image.open(requests.get(url_list[0], stream=True).raw)
-                )
-                errored.append(i)
-                print("Image error")
-        # print(f"{len(images)} images loaded into memory")
-        # print(f"{len(errored)} images failed to load")
+        # the namespace may also hold vectors from earlier date ranges
+        readiness = wait_for_namespace(
+            index, self.uid, len(self.catalog), exact=False
+        )
+        print(f"google_photos.py:: {self.uid} ready: {readiness}")
 
 
 def chunks(iterable, batch_size=100):
@@ -0,0 +1,82 @@
+import numpy as np
+
+
+def fuse_matches(match_lists, weights, method="weighted", rrf_k=60):
+    """
+    Fuse the ranked matches of several namespaces into one ranking.
+
+    Args:
+        match_lists: one list of {"id", "score"} matches per namespace, best first
+        weights: weight of each list
+        method: "weighted" sums weighted scores, each list's scores min-max
+            normalized first since text-image and text-text similarities
+            spread over different ranges; an id missing from a list scores
+            that list's lowest score since it ranked below all of them;
+            "rrf" sums weight / (rrf_k + rank) over the lists the id is in
+    Return:
+        list of {"id", "score"}, best first
+    """
+    ids = list(dict.fromkeys(match["id"] for matches in match_lists for match in matches))
+    if not ids:
+        return []
+    position = {media_id: i for i, media_id in enumerate(ids)}
+    scores = np.zeros((len(ids), len(match_lists)), dtype=np.float32)
+    for column, matches in enumerate(match_lists):
+        if not matches:
+            continue
+        rows = [position[match["id"]] for match in matches]
+        if method == "weighted":
+            list_scores = np.array([match["score"] for match in matches], dtype=np.float32)
+            spread = list_scores.max() - list_scores.min()
+            if spread > 0:
+                scores[rows, column] = (list_scores - list_scores.min()) / spread
+            else:
+                scores[rows, column] = 1.0
+        elif method == "rrf":
+            scores[rows, column] = 1.0 / (rrf_k + 1 + np.arange(len(matches)))
+        else:
+            raise ValueError(f"Unknown fusion method {method}")
+    fused = scores @ np.asarray(weights, dtype=np.float32)
+    order = np.argsort(-fused, kind="stable")
+    return [{"id": ids[i], "score": float(fused[i])} for i in order]
+
+
+def hybrid_query(
+    vector_index,
+    vector,
+    namespace,
+    top_k,
+    caption_weight=0.3,
+    filter=None,
+    executor=None,
+    method="weighted",
+):
+    """
+    Query the image and caption embeddings of namespace with one text embedding
+    and fuse the two rankings. Each side returns 3 * top_k candidates so an
+    image that only one side ranks highly can still make the fused top_k.
+
+    Args:
+        namespace: the image namespace, captions are in {namespace}_captions
+        caption_weight: weight of the caption scores, images get 1 - caption_weight
+        executor: runs the two queries in parallel when given
+    Return:
+        list of {"id", "score"}, best first
+    """
+
+    def query(namespace):
+        return vector_index.query(
+            vector=vector,
+            top_k=3 * top_k,
+            namespace=namespace,
+            filter=filter,
+            include_metadata=False,
+        )["matches"]
+
+    namespaces = [namespace, f"{namespace}_captions"]
+    if executor is None:
+        match_lists = [query(name) for name in namespaces]
+    else:
+        match_lists = list(executor.map(query, namespaces))
+    fused = fuse_matches(match_lists, [1 - caption_weight, caption_weight], method)
+    return fused[:top_k]
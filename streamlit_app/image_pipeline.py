@@ -0,0 +1,220 @@
+import io
+import queue
+import threading
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from photo_urls import caption_url, embed_url, fetch_bytes
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class _Stage:
+    """
+    A pool of worker threads reading from in_q and writing to out_q.
+
+    fn(item) returns the item for the next stage, or None to drop it. When
+    every worker has seen _DONE the stage forwards _DONE downstream once.
+    """
+
+    def __init__(self, fn, in_q, out_q, workers):
+        self.fn = fn
+        self.in_q = in_q
+        self.out_q = out_q
+        self.remaining = workers
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._work, daemon=True) for _ in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            item = self.in_q.get()
+            if item is _DONE:
+                # let the sibling workers see the end of input too
+                self.in_q.put(_DONE)
+                with self.lock:
+                    self.remaining -= 1
+                    last = self.remaining == 0
+                if last:
+                    self.out_q.put(_DONE)
+                return
+            result = self.fn(item)
+            if result is not None:
+                self.out_q.put(result)
+
+
+class ImagePipeline:
+    """
+    Download -> decode -> embed (and optionally caption) pipeline over media items.
+
+    Each stage is connected to the next by a bounded queue, so at most
+    queue_size items wait between stages and peak memory does not depend on
+    how many items are fed in. Items that fail to download or decode are
+    recorded in self.failed and skipped.
+    """
+
+    def __init__(
+        self,
+        embed_fn,
+        batch_size=32,
+        download_workers=16,
+        decode_workers=4,
+        queue_size=64,
+        timeout=30,
+        url_fn=embed_url,
+        session=None,
+        caption_fn=None,
+        decode_size=224,
+    ):
+        """
+        Args:
+            embed_fn: called with a list of RGB PIL images, returns one embedding
+                per image, or (embeddings, mask) where mask is False for images
+                that could not be embedded
+            batch_size: number of images handed to embed_fn at once
+            download_workers, decode_workers: threads in each stage
+            queue_size: capacity of each queue between stages
+            timeout: per request timeout in seconds
+            url_fn: maps a baseUrl to the sized url that is downloaded
+            caption_fn: optional, called with the same batches of images as
+                embed_fn and returns a caption (or None) per image; captions
+                of embedded items are collected in self.captions
+            decode_size: JPEGs are decoded in draft mode at the smallest scale
+                whose shorter side is still at least this many pixels, the
+                models' input size; None decodes at full size
+        """
+        self.embed_fn = embed_fn
+        self.batch_size = batch_size
+        self.download_workers = download_workers
+        self.decode_workers = decode_workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.url_fn = url_fn
+        self.caption_fn = caption_fn
+        self.decode_size = decode_size
+        self.captions = {}
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=download_workers, pool_maxsize=download_workers
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self.failed = []
+        self.bytes_downloaded = 0
+        self._stats_lock = threading.Lock()
+
+    def _record_failure(self, media_id, url, error):
+        with self._stats_lock:
+            self.failed.append({"id": media_id, "url": url, "error": str(error)})
+
+    def _download(self, item):
+        media_id, base_url = item
+        url = self.url_fn(base_url)
+        try:
+            content = fetch_bytes(self.session, url, self.timeout)
+            with self._stats_lock:
+                self.bytes_downloaded += len(content)
+            return media_id, url, content
+        except Exception as e:
+            print(f"Error downloading image {url}, error: {e}")
+            self._record_failure(media_id, url, e)
+
+    def _decode(self, item):
+        media_id, url, content = item
+        try:
+            image = Image.open(io.BytesIO(content))
+            if self.decode_size:
+                # must happen before the pixels are loaded, convert loads them
+                image.draft("RGB", (self.decode_size, self.decode_size))
+            image = image.convert("RGB")
+            return media_id, image
+        except Exception as e:
+            print(f"Error decoding image {url}, error: {e}")
+            self._record_failure(media_id, url, e)
+
+    def run(self, items):
+        """
+        Args:
+            items: iterable of (media id, baseUrl) pairs
+        Return:
+            generator of (ids, embeddings) batches in completion order
+        """
+        todo = queue.Queue(maxsize=self.queue_size)
+        downloaded = queue.Queue(maxsize=self.queue_size)
+        decoded = queue.Queue(maxsize=self.queue_size)
+
+        def feed():
+            for item in items:
+                todo.put(item)
+            todo.put(_DONE)
+
+        threading.Thread(target=feed, daemon=True).start()
+        _Stage(self._download, todo, downloaded, self.download_workers)
+        _Stage(self._decode, downloaded, decoded, self.decode_workers)
+
+        batch = []
+        while True:
+            item = decoded.get()
+            if item is not _DONE:
+                batch.append(item)
+            if batch and (len(batch) == self.batch_size or item is _DONE):
+                ids = [media_id for media_id, _ in batch]
+                images = [image for _, image in batch]
+                batch = []
+                embeddings = self.embed_fn(images)
+                if self.caption_fn is not None:
+                    for media_id, caption in zip(ids, self.caption_fn(images)):
+                        if caption:
+                            self.captions[media_id] = caption
+                if isinstance(embeddings, tuple):
+                    embeddings, mask = embeddings
+                    for media_id, ok in zip(ids, mask):
+                        if not ok:
+                            self._record_failure(media_id, None, "embedding failed")
+                    ids = [media_id for media_id, ok in zip(ids, mask) if ok]
+                    embeddings = [e for e, ok in zip(embeddings, mask) if ok]
+                yield ids, embeddings
+            if item is _DONE:
+                return
+
+
+def embed_media_items_df(media_items_df, embed_fn, caption_fn=None, **pipeline_args):
+    """
+    Embed every image of media_items_df through an ImagePipeline.
+
+    Args:
+        caption_fn: also caption the images while they are downloaded; they
+            are then fetched at caption size, which CLIP shrinks for itself
+    Return:
+        media_items_df: the rows that embedded successfully, with a vector
+            column, and a caption column (None where captioning failed) when
+            caption_fn is given
+        failed: list of {"id", "url", "error"} for the rows that were skipped
+    """
+    if caption_fn is not None:
+        pipeline_args.setdefault("url_fn", caption_url)
+        # BLIP's input size, CLIP shrinks the images for itself
+        pipeline_args.setdefault("decode_size", 384)
+    pipeline = ImagePipeline(embed_fn, caption_fn=caption_fn, **pipeline_args)
+    vectors = {}
+    items = zip(media_items_df["id"].values, media_items_df["baseUrl"].values)
+    for ids, embeddings in pipeline.run(items):
+        for media_id, embedding in zip(ids, embeddings):
+            vectors[media_id] = embedding.tolist()
+
+    media_items_df = media_items_df[media_items_df["id"].isin(vectors.keys())].copy()
+    media_items_df["vector"] = media_items_df["id"].map(vectors)
+    if caption_fn is not None:
+        media_items_df["caption"] = [
+            pipeline.captions.get(media_id) for media_id in media_items_df["id"].values
+        ]
+    media_items_df.reset_index(drop=True, inplace=True)
+    return media_items_df, pipeline.failed
@@ -15,6 +15,8 @@ import numpy as np
 from dotenv import load_dotenv
 from sql_queries.queries import GET_PHOTO_BY_DATE
 from google_photos import GooglePhotosApi
+from photo_urls import thumbnail_url
+from date_filters import journey_filter
 import ipyplot
 
 ROOT_DIRECTORY = os.path.dirname(os.path.abspath(os.curdir))
@@ -99,15 +101,15 @@ class ImageSearchApp:
         self.index = pinecone.Index(self.index_name)
 
     def get_images(self):
-        return self.google_photos_api.media_items_df["baseUrl"]
+        return self.google_photos_api.catalog.base_urls
 
     def search_and_display(self, _query):
-        years_filter = [2023]
-        months_filter = [2]
+        # "beach in june 2022" searches "beach" among the photos of June 2022
+        steps, date_filter = journey_filter([_query])
         top_k = 30
-        return self.query_images(_query, years_filter, months_filter, top_k)
+        return self.query_images(steps[0] if steps else _query, date_filter, top_k)
 
-    def query_images(self, query, years_filter, months_filter, top_k):
+    def query_images(self, query, date_filter, top_k):
         # create the query vector
         xq = self.model.encode(query).tolist()
 
@@ -115,36 +117,16 @@ class ImageSearchApp:
         xc = self.index.query(
             xq,
             namespace=self.google_photos_api.uid,
-            # filter={"year": {"$in": years_filter}, "month": {"$in": months_filter}},
+            filter=date_filter,
             top_k=top_k,
             include_metadata=True,
         )
 
-        img_urls = []
-        meta_text = []
-
-        media_items_df = self.google_photos_api.media_items_df
-        print(media_items_df.head())
-        # print(xc)
-        for i in range(0, top_k):
-            img_id = xc["matches"][i]["id"]
-            print("got id", img_id)
-            if img_id in media_items_df["id"].values:
-                img_url = media_items_df.loc[
-                    media_items_df["id"] == img_id, "baseUrl"
-                ].iloc[0]
-                # print("got url", img_url)
-                img_urls.append(img_url)
-                img_year = media_items_df.loc[
-                    media_items_df["id"] == img_id, "metadata"
-                ].iloc[0]["year"]
-                # print("got year", img_year)
-                img_month = media_items_df.loc[
-                    media_items_df["id"] == img_id, "metadata"
-                ].iloc[0]["month"]
-                # print("got month", img_month)
-                img_text = month_name(img_month) + " of " + str(img_year)
-                meta_text.append(img_text)
+        # hydrate every hit with one lookup in the catalog's id index
+        ids = [match["id"] for match in xc["matches"][:top_k]]
+        hits = self.google_photos_api.catalog.hydrate(ids)
+        img_urls = [hit.base_url for hit in hits]
+        meta_text = [month_name(hit.month) + " of " + str(hit.year) for hit in hits]
 
         # ipyplot.plot_images(img_urls, meta_text, img_width=250, show_url=False)
         return img_urls
@@ -319,7 +301,7 @@ match st.session_state["app_state"]:
         col = 0
         for image_url in batch:
             with grid[col]:
-                st.image(image_url)
+                st.image(thumbnail_url(image_url))
             col = (col + 1) % row_size
     case 4:
         st.header("Results")
@@ -330,7 +312,9 @@ match st.session_state["app_state"]:
             image_urls = app.search_and_display(query)
             cols = st.columns(len(image_urls))
             img = image_select(
-                label="Select the image", images=image_urls, return_value="index"
+                label="Select the image",
+                images=[thumbnail_url(url) for url in image_urls],
+                return_value="index",
             )
             # TODO: LEARN!
             print(img)
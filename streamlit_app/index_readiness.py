@@ -0,0 +1,59 @@
+import time
+
+
+class IndexNotReadyError(TimeoutError):
+    def __init__(self, namespace, vector_count, expected_count, result):
+        super().__init__(
+            f"namespace {namespace} has {vector_count} of {expected_count} vectors "
+            f"after {result['seconds']:.1f}s"
+        )
+        self.result = result
+
+
+def wait_for_namespace(
+    index,
+    namespace,
+    expected_count,
+    exact=True,
+    timeout=60.0,
+    initial_delay=0.25,
+    max_delay=5.0,
+    factor=2.0,
+):
+    """
+    Poll describe_index_stats with exponential backoff until namespace holds
+    expected_count vectors.
+
+    Args:
+        index: pinecone.Index or FakeIndex
+        expected_count: vector count the namespace should reach
+        exact: require the count to equal expected_count, otherwise at least it
+        timeout: seconds before giving up with IndexNotReadyError
+        initial_delay, max_delay, factor: backoff between polls
+    Return:
+        dict with the final vector_count, the number of polls and the seconds waited
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+    polls = 0
+    while True:
+        stats = index.describe_index_stats()
+        polls += 1
+        vector_count = stats["namespaces"].get(namespace, {}).get("vector_count", 0)
+        result = {
+            "namespace": namespace,
+            "vector_count": vector_count,
+            "polls": polls,
+            "seconds": time.monotonic() - start,
+        }
+        if vector_count == expected_count or (
+            not exact and vector_count > expected_count
+        ):
+            return result
+
+        now = time.monotonic()
+        if now >= deadline:
+            raise IndexNotReadyError(namespace, vector_count, expected_count, result)
+        time.sleep(min(delay, deadline - now))
+        delay = min(delay * factor, max_delay)
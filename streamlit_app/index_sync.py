@@ -0,0 +1,138 @@
+import hashlib
+import itertools
+import json
+import os
+
+import numpy as np
+
+
+def chunks(iterable, batch_size=100):
+    """A helper function to break an iterable into chunks of size batch_size."""
+    it = iter(iterable)
+    chunk = tuple(itertools.islice(it, batch_size))
+    while chunk:
+        yield chunk
+        chunk = tuple(itertools.islice(it, batch_size))
+
+
+def vector_version(vector, metadata):
+    """Short content hash of a vector and its metadata."""
+    digest = hashlib.sha1(np.asarray(vector, dtype=np.float32).tobytes())
+    digest.update(json.dumps(metadata, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:16]
+
+
+class IndexManifest:
+    """
+    The ids and vector versions last synced to one namespace, stored as JSON.
+
+    versions only lists ids known to be in the index with that version: new
+    versions are recorded after their upserts succeed, and ids are moved to
+    pending_deletes before they are deleted. After a failed run the next sync
+    upserts whatever is missing and finishes the pending deletes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.versions = {}
+        self.pending_deletes = []
+        self.exists = os.path.exists(path)
+        if self.exists:
+            with open(path) as manifest_file:
+                manifest = json.load(manifest_file)
+            self.versions = manifest["versions"]
+            self.pending_deletes = manifest.get("pending_deletes", [])
+
+    def save(self, versions, pending_deletes=()):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as manifest_file:
+            json.dump(
+                {"versions": versions, "pending_deletes": list(pending_deletes)},
+                manifest_file,
+            )
+        os.replace(tmp_path, self.path)
+        self.versions = versions
+        self.pending_deletes = list(pending_deletes)
+        self.exists = True
+
+
+def plan_sync(indexed_versions, versions):
+    """
+    Args:
+        indexed_versions: id -> version currently in the index
+        versions: id -> version that should be in the index
+    Return:
+        to_upsert: ids that are new or whose version changed
+        to_delete: ids that are indexed but no longer wanted
+    """
+    to_upsert = [
+        media_id
+        for media_id, version in versions.items()
+        if indexed_versions.get(media_id) != version
+    ]
+    to_delete = [media_id for media_id in indexed_versions if media_id not in versions]
+    return to_upsert, to_delete
+
+
+def sync_namespace(index, namespace, ids, vectors, metadata, manifest_path, batch_size=100):
+    """
+    Make namespace hold exactly the given vectors, touching only what changed.
+
+    New and changed vectors are upserted before removed ids are deleted, so the
+    namespace is never empty and search keeps working while a sync runs.
+
+    Args:
+        index: pinecone.Index created with pool_threads, or anything with the same
+            upsert/delete/describe_index_stats surface
+        ids, vectors, metadata: parallel sequences describing the wanted vectors
+        manifest_path: where the namespace's IndexManifest lives
+    Return:
+        dict with the number of upserted, deleted and unchanged vectors
+    """
+    manifest = IndexManifest(manifest_path)
+    records = {
+        media_id: (vector, meta) for media_id, vector, meta in zip(ids, vectors, metadata)
+    }
+    versions = {
+        media_id: vector_version(vector, meta)
+        for media_id, (vector, meta) in records.items()
+    }
+
+    if not manifest.exists:
+        # Nothing tells us what an older run left behind, rebuild once
+        namespaces = index.describe_index_stats()["namespaces"]
+        if namespaces.get(namespace, {}).get("vector_count", 0) > 0:
+            print(f"index_sync.py:: no manifest for {namespace}, rebuilding it")
+            index.delete(delete_all=True, namespace=namespace)
+
+    to_upsert, to_delete = plan_sync(manifest.versions, versions)
+    # deletes an earlier run started but did not finish, unless the id is back
+    to_delete += [
+        media_id
+        for media_id in manifest.pending_deletes
+        if media_id not in versions and media_id not in manifest.versions
+    ]
+
+    upserts = (
+        (media_id, records[media_id][0], records[media_id][1]) for media_id in to_upsert
+    )
+    async_results = [
+        index.upsert(vectors=chunk, namespace=namespace, async_req=True)
+        for chunk in chunks(upserts, batch_size=batch_size)
+    ]
+    # Wait for and retrieve responses (this raises in case of error)
+    [async_result.get() for async_result in async_results]
+
+    # every wanted version is in the index now; the removed ids are recorded as
+    # pending first, so a failure part way through the deletes cannot leave the
+    # manifest listing ids that are gone
+    manifest.save(versions, pending_deletes=to_delete)
+    for chunk in chunks(to_delete, batch_size=1000):
+        index.delete(ids=list(chunk), namespace=namespace)
+    manifest.save(versions)
+    return {
+        "upserted": len(to_upsert),
+        "deleted": len(to_delete),
+        "unchanged": len(versions) - len(to_upsert),
+    }
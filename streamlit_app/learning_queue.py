@@ -0,0 +1,245 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+CREATE_LEARNINGS_TABLE = """
+CREATE TABLE IF NOT EXISTS learnings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL,
+    journey TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    image_url TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    done_at REAL,
+    caption TEXT,
+    error TEXT
+)
+"""
+CREATE_STATUS_INDEX = (
+    "CREATE INDEX IF NOT EXISTS learnings_status ON learnings (status, next_attempt_at)"
+)
+
+
+def few_shot_example(search_journey, caption):
+    queries_string = ", ".join(search_journey)
+    return f"User Queries: {queries_string} \nSynthesized Query: {caption}"
+
+
+class LearningQueue:
+    """
+    Durable queue of accepted (journey, target image) learnings.
+
+    Accepting a target image only writes a row to a SQLite database in WAL
+    mode. A worker thread claims pending rows in batches, captions the target
+    images concurrently, embeds the journeys, and upserts each user's batch
+    into their {uid}_fewshot namespace in one request. A failed batch is
+    retried with exponential backoff; rows that keep failing are marked failed
+    with their error. Rows left in flight by a crash are retried on start-up.
+    """
+
+    def __init__(
+        self,
+        db_path,
+        caption_fn,
+        embed_fn,
+        vector_index,
+        batch_size=16,
+        caption_workers=4,
+        max_attempts=5,
+        backoff=2.0,
+        poll_interval=1.0,
+    ):
+        """
+        Args:
+            caption_fn: (target media id, image url) -> caption
+            embed_fn: list of texts -> list of embeddings
+            vector_index: VectorStore the few-shot examples are upserted to
+            batch_size: rows claimed per batch
+            caption_workers: concurrent caption requests
+            max_attempts: attempts before a row is marked failed
+            backoff: seconds before the first retry, doubled on every attempt
+            poll_interval: seconds between checks for retries that became due
+        """
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.caption_fn = caption_fn
+        self.embed_fn = embed_fn
+        self.vector_index = vector_index
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.caption_executor = ThreadPoolExecutor(max_workers=caption_workers)
+        self.latencies = deque(maxlen=1000)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute(CREATE_LEARNINGS_TABLE)
+            self.connection.execute(CREATE_STATUS_INDEX)
+            self.connection.execute(
+                "UPDATE learnings SET status = 'pending' WHERE status = 'in_flight'"
+            )
+
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def _execute(self, query, params=()):
+        with self.lock, self.connection:
+            return self.connection.execute(query, params).fetchall()
+
+    def enqueue(self, uid, search_journey, target_id, image_url):
+        """Persist a learning and wake the worker. Returns the row id."""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO learnings (uid, journey, target_id, image_url, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (uid, json.dumps(list(search_journey)), target_id, image_url, time.time()),
+            )
+        self.wakeup.set()
+        return cursor.lastrowid
+
+    def _claim(self):
+        with self.lock, self.connection:
+            rows = self.connection.execute(
+                "SELECT id, uid, journey, target_id, image_url, attempts, enqueued_at "
+                "FROM learnings WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (time.time(), self.batch_size),
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE learnings SET status = 'in_flight' WHERE id = ?",
+                [(row[0],) for row in rows],
+            )
+        return rows
+
+    def _fail(self, rows, error):
+        now = time.time()
+        updates = []
+        for row in rows:
+            attempts = row[5] + 1
+            status = "failed" if attempts >= self.max_attempts else "pending"
+            retry_at = now + self.backoff * 2 ** (attempts - 1)
+            updates.append((status, attempts, retry_at, str(error), row[0]))
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "UPDATE learnings SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "error = ? WHERE id = ?",
+                updates,
+            )
+        print(f"learning_queue.py:: {len(rows)} learnings failed: {error}")
+
+    def _process(self, rows):
+        # caption every target image concurrently, a failure only fails its row
+        futures = [
+            self.caption_executor.submit(self.caption_fn, row[3], row[4]) for row in rows
+        ]
+        captioned = []
+        for row, future in zip(rows, futures):
+            try:
+                captioned.append((row, str(future.result())))
+            except Exception as e:
+                self._fail([row], e)
+        if not captioned:
+            return
+
+        journeys = [json.loads(row[2]) for row, _ in captioned]
+        try:
+            embeddings = self.embed_fn([", ".join(journey) for journey in journeys])
+        except Exception as e:
+            self._fail([row for row, _ in captioned], e)
+            return
+
+        by_namespace = {}
+        for (row, caption), journey, embedding in zip(captioned, journeys, embeddings):
+            by_namespace.setdefault(f"{row[1]}_fewshot", []).append(
+                (
+                    row[3],
+                    np.asarray(embedding, dtype=np.float32).tolist(),
+                    {"id": row[3], "learnings": few_shot_example(journey, caption)},
+                )
+            )
+        for namespace, vectors in by_namespace.items():
+            namespace_rows = [row for row, _ in captioned if f"{row[1]}_fewshot" == namespace]
+            try:
+                self.vector_index.upsert(vectors=vectors, namespace=namespace)
+                self.vector_index.flush()
+            except Exception as e:
+                self._fail(namespace_rows, e)
+                continue
+            now = time.time()
+            with self.lock, self.connection:
+                self.connection.executemany(
+                    "UPDATE learnings SET status = 'done', done_at = ?, caption = ?, "
+                    "error = NULL WHERE id = ?",
+                    [
+                        (now, caption, row[0])
+                        for row, caption in captioned
+                        if f"{row[1]}_fewshot" == namespace
+                    ],
+                )
+            self.latencies.extend(now - row[6] for row in namespace_rows)
+            print(f"learning_queue.py:: learned {len(vectors)} examples in {namespace}")
+
+    def _run(self):
+        # an unexpected error (e.g. the database is locked) must not end the
+        # worker: it is logged, the batch goes back to pending and the worker
+        # retries after a backoff that grows while the errors last
+        errors = 0
+        while not self.stopped.is_set():
+            rows = []
+            try:
+                rows = self._claim()
+                if rows:
+                    self._process(rows)
+            except Exception as e:
+                errors += 1
+                print(f"learning_queue.py:: worker error, retrying: {e!r}")
+                if rows:
+                    try:
+                        self._fail(rows, e)
+                    except Exception as fail_error:
+                        print(f"learning_queue.py:: could not release batch: {fail_error!r}")
+                self.stopped.wait(min(self.backoff * 2 ** (errors - 1), 60.0))
+                continue
+            errors = 0
+            if rows:
+                continue
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        self.wakeup.set()
+        self.worker.join(timeout)
+
+    def stats(self):
+        """Queue depth by status and the enqueue-to-learned latency of recent rows."""
+        counts = dict(
+            self._execute("SELECT status, COUNT(*) FROM learnings GROUP BY status")
+        )
+        oldest = self._execute(
+            "SELECT MIN(enqueued_at) FROM learnings WHERE status IN ('pending', 'in_flight')"
+        )[0][0]
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            "depth": counts.get("pending", 0) + counts.get("in_flight", 0),
+            "in_flight": counts.get("in_flight", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_pending_seconds": time.time() - oldest if oldest else 0.0,
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p95": float(np.percentile(latencies, 95)),
+        }
@@ -0,0 +1,227 @@
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class MediaItem:
+    """Read-only view of one catalog row."""
+
+    __slots__ = ("catalog", "row")
+
+    def __init__(self, catalog, row):
+        self.catalog = catalog
+        self.row = row
+
+    @property
+    def id(self):
+        return self.catalog.ids[self.row]
+
+    @property
+    def base_url(self):
+        return self.catalog.base_urls[self.row]
+
+    @property
+    def creation_time(self):
+        return self.catalog.creation_times[self.row]
+
+    @property
+    def year(self):
+        return int(self.catalog.years[self.row])
+
+    @property
+    def month(self):
+        return int(self.catalog.months[self.row])
+
+    @property
+    def day(self):
+        return int(self.catalog.days[self.row])
+
+    @property
+    def vector(self):
+        return self.catalog.vectors[self.row]
+
+    @property
+    def caption(self):
+        if self.catalog.captions is None:
+            return None
+        return self.catalog.captions[self.row]
+
+    @property
+    def metadata(self):
+        return {"id": self.id, "year": self.year, "month": self.month, "day": self.day}
+
+    def __repr__(self):
+        return f"MediaItem(id={self.id!r}, {self.year}-{self.month:02d}-{self.day:02d})"
+
+
+class MediaCatalog:
+    """
+    Columnar, read-only store of a user's indexed media items.
+
+    Embeddings are one contiguous float16 matrix, dates are fixed-width integer
+    columns and ids are interned strings with a hashed index to their row, which
+    keeps a catalog a fraction of the size of the equivalent pandas frame with
+    a list per vector and a dict per metadata cell. Every array is frozen so a
+    catalog can be shared by all sessions of the same uid.
+    """
+
+    def __init__(
+        self,
+        ids,
+        base_urls,
+        creation_times,
+        years,
+        months,
+        days,
+        vectors,
+        captions=None,
+        caption_vectors=None,
+    ):
+        self.ids = np.array([sys.intern(str(media_id)) for media_id in ids], dtype=object)
+        self.base_urls = np.asarray(base_urls, dtype=object)
+        self.creation_times = np.asarray(creation_times, dtype="datetime64[s]")
+        self.years = np.asarray(years, dtype=np.int16)
+        self.months = np.asarray(months, dtype=np.int8)
+        self.days = np.asarray(days, dtype=np.int8)
+        self.vectors = np.ascontiguousarray(vectors)
+        self.captions = None if captions is None else np.asarray(captions, dtype=object)
+        self.caption_vectors = (
+            None if caption_vectors is None else np.ascontiguousarray(caption_vectors)
+        )
+        index = pd.Index(self.ids)
+        # the first row wins if an id appears twice
+        first = ~index.duplicated()
+        self._index = index[first]
+        self._positions = np.flatnonzero(first)
+        self._freeze()
+
+    def _freeze(self):
+        for array in (
+            self.ids,
+            self.base_urls,
+            self.creation_times,
+            self.years,
+            self.months,
+            self.days,
+            self.vectors,
+            self.captions,
+            self.caption_vectors,
+        ):
+            if array is not None:
+                array.setflags(write=False)
+
+    def __setstate__(self, state):
+        # unpickled arrays come back writeable
+        self.__dict__.update(state)
+        self._freeze()
+
+    @classmethod
+    def from_frame(cls, media_items_df, dtype=np.float16):
+        """
+        Args:
+            media_items_df: frame from normalize_media_items with a vector column,
+                and optionally caption and caption_embeddings columns
+            dtype: storage type of the embedding matrices
+        """
+
+        def matrix(column):
+            if column not in media_items_df:
+                return None
+            return np.array(media_items_df[column].tolist(), dtype=dtype)
+
+        captions = None
+        if "caption" in media_items_df:
+            # missing captions may have become NaN in the frame
+            captions = [
+                caption if isinstance(caption, str) and caption else None
+                for caption in media_items_df["caption"].values
+            ]
+        created = pd.to_datetime(
+            media_items_df["creationTime"], utc=True, format="ISO8601"
+        ).dt.tz_localize(None)
+        return cls(
+            ids=media_items_df["id"].values,
+            base_urls=media_items_df["baseUrl"].values,
+            creation_times=created.values,
+            years=media_items_df["year"].values,
+            months=media_items_df["month"].values,
+            days=media_items_df["day"].values,
+            vectors=matrix("vector"),
+            captions=captions,
+            caption_vectors=matrix("caption_embeddings"),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        return MediaItem(self, row)
+
+    def __iter__(self):
+        return (MediaItem(self, row) for row in range(len(self)))
+
+    def rows(self, ids):
+        """Row positions of ids, -1 for ids that are not in the catalog."""
+        found = self._index.get_indexer(list(ids))
+        return np.where(found >= 0, self._positions[found], -1)
+
+    def hydrate(self, ids):
+        """MediaItem views for the ids found in the catalog, in the order of ids."""
+        return [MediaItem(self, row) for row in self.rows(ids) if row >= 0]
+
+    def captioned_rows(self):
+        """Rows that have a caption."""
+        if self.captions is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero([caption is not None for caption in self.captions])
+
+    def metadata(self):
+        """Vector metadata for every row, as upserted to the vector index."""
+        return [
+            {"id": media_id, "year": int(year), "month": int(month), "day": int(day)}
+            for media_id, year, month, day in zip(
+                self.ids, self.years, self.months, self.days
+            )
+        ]
+
+    def to_frame(self):
+        """Display frame without the embedding matrices."""
+        media_items_df = pd.DataFrame(
+            {
+                "id": self.ids,
+                "baseUrl": self.base_urls,
+                "creationTime": self.creation_times,
+                "year": self.years,
+                "month": self.months,
+                "day": self.days,
+            }
+        )
+        if self.captions is not None:
+            media_items_df["caption"] = self.captions
+        return media_items_df
+
+    def nbytes(self):
+        arrays = [self.creation_times, self.years, self.months, self.days, self.vectors]
+        if self.caption_vectors is not None:
+            arrays.append(self.caption_vectors)
+        return sum(array.nbytes for array in arrays) + sum(
+            sys.getsizeof(value) for value in self.base_urls
+        ) + sum(sys.getsizeof(value) for value in self.ids)
+
+
+class CatalogRegistry:
+    """The current catalog of each uid, shared read-only by all its sessions."""
+
+    def __init__(self):
+        self.catalogs = {}
+        self.lock = threading.Lock()
+
+    def publish(self, uid, catalog):
+        with self.lock:
+            self.catalogs[uid] = catalog
+
+    def get(self, uid):
+        with self.lock:
+            return self.catalogs.get(uid)
@@ -0,0 +1,36 @@
+import pandas as pd
+
+
+def normalize_media_items(items):
+    """
+    Build the media items data frame from raw mediaItems:search records.
+
+    Records are collected into plain column lists in a single pass and turned
+    into one frame at the end, so the cost stays linear in library size.
+
+    Args:
+        items: iterable of raw media item dicts, e.g. MediaItemLister.stream()
+    Return:
+        media_items_df: one row per media item with id, baseUrl, creationTime
+            and integer year, month and day columns
+    """
+    ids = []
+    base_urls = []
+    creation_times = []
+    for item in items:
+        ids.append(item["id"])
+        base_urls.append(item["baseUrl"])
+        creation_times.append(item["mediaMetadata"]["creationTime"])
+
+    media_items_df = pd.DataFrame(
+        {"id": ids, "baseUrl": base_urls, "creationTime": creation_times}
+    )
+    # creationTime is RFC 3339 in UTC, with or without fractional seconds
+    created = pd.to_datetime(
+        media_items_df["creationTime"], utc=True, format="ISO8601"
+    )
+    media_items_df["year"] = created.dt.year.astype("int64")
+    media_items_df["month"] = created.dt.month.astype("int64")
+    media_items_df["day"] = created.dt.day.astype("int64")
+    return media_items_df
+
@@ -1,13 +1,15 @@
-import json
-import requests
-import pinecone
-import itertools
+import os
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import streamlit as st
-from datetime import timedelta
 from google.auth.transport.requests import Request
 import utils
+from photos_listing import MediaItemLister
+from media_items import normalize_media_items
+from media_catalog import MediaCatalog
+from index_sync import sync_namespace
+from index_readiness import IndexNotReadyError, wait_for_namespace
 from utils_modal import stub, ModalEmbedding
 
 st.set_page_config(layout="wide")
@@ -28,144 +30,155 @@ if credentials.expired and credentials.refresh_token:
     st.info("Credentials refreshed")
 
 
-pinecone_index = utils.get_pinecone_image_index()
-
-
-def list_of_media_items(year, month, day, media_items_df):
-    """
-    Args:
-        year, month, day: day for the filter of the API call
-        self.media_items_df: existing data frame with all find media items so far
-    Return:
-        media_items_df: media items data frame extended by the articles found for the specified tag
-        items_df: media items uploaded on specified date
-    """
-
-    items_list_df = pd.DataFrame()
-
-    # create request for specified date
-    response = get_response_from_medium_api(year, month, day)
-
-    try:
-        for item in response.json()["mediaItems"]:
-            items_df = pd.DataFrame(item)
-            items_df = items_df.rename(columns={"mediaMetadata": "creationTime"})
-            items_df.set_index("creationTime")
-            items_df = items_df[items_df.index == "creationTime"]
-
-            # append the existing media_items data frame
-            items_list_df = pd.concat([items_list_df, items_df])
-            media_items_df = pd.concat([media_items_df, items_df])
-
-    except:
-        print(response.text)
-
-    return (items_list_df, media_items_df)
-
-
-def get_response_from_medium_api(year, month, day):
-    url = "https://photoslibrary.googleapis.com/v1/mediaItems:search"
-    payload = {
-        "filters": {
-            "dateFilter": {"dates": [{"day": day, "month": month, "year": year}]}
-        }
-    }
-    headers = {
-        "content-type": "application/json",
-        "Authorization": "Bearer {}".format(credentials.token),
-    }
-
-    try:
-        res = requests.request("POST", url, data=json.dumps(payload), headers=headers)
-    except:
-        print("URL: ", url)
-        print("Payload: ", json.dumps(payload))
-        print("Headers: ", headers)
-        print("Request error")
-
-    return res
+vector_index = utils.get_vector_index()
+catalog_registry = utils.get_catalog_registry()
 
 
 @st.cache_data(ttl=3600)
 def get_images_in_date_range(uid, sdate, edate):
-    date_list = pd.date_range(sdate, edate - timedelta(days=1), freq="d")
-    media_items_df = pd.DataFrame()
-    for i, date in tqdm(enumerate(date_list), desc="Fetching Dates", total=len(date_list)):
-        items_df, media_items_df = list_of_media_items(
-            year=date.year,
-            month=date.month,
-            day=date.day,
-            media_items_df=media_items_df,
-        )
+    lister = MediaItemLister(credentials.token)
+    media_items_df = normalize_media_items(
+        tqdm(lister.stream(sdate, edate), desc="Fetching media items")
+    )
     if len(media_items_df) == 0:
         return None
-    else:
-        media_items_df.drop(
-            ["productUrl", "mimeType", "filename"], axis=1, inplace=True
-        )
-        media_items_df["year"] = [
-            int(x) for x in media_items_df["creationTime"].str[0:4].values
-        ]
-        media_items_df["month"] = [
-            int(x) for x in media_items_df["creationTime"].str[5:7].values
-        ]
-        media_items_df["day"] = [
-            int(x) for x in media_items_df["creationTime"].str[8:10].values
-        ]
-        media_items_df.reset_index(drop=True, inplace=True)
-        return media_items_df
+    return media_items_df
 
 
-@st.cache_data
-def embed_images_with_modal(media_items_df):
-    with stub.run() as _:
-        media_items_df = ModalEmbedding().generate.remote(media_items_df)
+def embed_images_with_modal(media_items_df, captions=False):
+    """
+    Embed the images of media_items_df on Modal. Embeddings are cached by media
+    item id, so only items that were never embedded before are sent to Modal.
+    Rows whose image could not be embedded are dropped.
+
+    Args:
+        captions: also caption the images with BLIP on Modal while they are
+            downloaded. Captions are stored by media item id, so items
+            captioned (or failed by BLIP) before are not captioned again.
+            Stored captions are attached as caption and caption_embeddings
+            columns whether or not new items are captioned.
+    """
+    ids = media_items_df["id"].values
+    embedding_cache = utils.get_embedding_cache()
+    cached_vectors, hits = embedding_cache.get(ids)
+    vectors = dict(zip(ids[hits], cached_vectors[hits].tolist()))
+
+    caption_store = utils.get_caption_store()
+    stored_captions = caption_store.get_many(ids)
+    missing = ~hits
+    if captions:
+        missing |= ~np.isin(ids, list(stored_captions))
+
+    missing_df = media_items_df[missing]
+    if len(missing_df) > 0:
+        with stub.run() as _:
+            embedded_df = ModalEmbedding().generate.remote(missing_df, captions=captions)
+        if len(embedded_df) > 0:
+            embedding_cache.put(
+                embedded_df["id"].values, np.array(embedded_df["vector"].tolist())
+            )
+            vectors.update(zip(embedded_df["id"].values, embedded_df["vector"].values))
+        if captions and len(embedded_df) > 0:
+            # an empty caption records that BLIP failed on the item
+            new_captions = {
+                media_id: caption or ""
+                for media_id, caption in zip(embedded_df["id"].values, embedded_df["caption"])
+            }
+            caption_store.put_many(new_captions)
+            stored_captions.update(new_captions)
+    print(f"Embedding cache: {embedding_cache.stats()}")
+
+    media_items_df = media_items_df[media_items_df["id"].isin(vectors.keys())].copy()
+    media_items_df["vector"] = media_items_df["id"].map(vectors)
+    media_items_df.reset_index(drop=True, inplace=True)
+    if captions or stored_captions:
+        item_captions = [
+            stored_captions.get(media_id) or None
+            for media_id in media_items_df["id"].values
+        ]
+        media_items_df["caption"] = item_captions
+        media_items_df["caption_embeddings"] = embed_captions(item_captions)
     return media_items_df
 
 
-def chunks(iterable, batch_size=100):
-    """A helper function to break an iterable into chunks of size batch_size."""
-    it = iter(iterable)
-    chunk = tuple(itertools.islice(it, batch_size))
-    while chunk:
-        yield chunk
-        chunk = tuple(itertools.islice(it, batch_size))
+def embed_captions(captions):
+    """
+    CLIP text embeddings of captions, in the space queries are embedded in.
+    Zero rows for items without a caption.
+    """
+    embeddings = np.zeros((len(captions), 512), dtype=np.float32)
+    rows = [i for i, caption in enumerate(captions) if caption]
+    if rows:
+        embeddings[rows] = utils.load_embedder().embed_documents(
+            [captions[i] for i in rows]
+        )
+    return list(embeddings)
 
 
-def upsert_to_pinecone(namespace, media_items_df, is_caption=False):
-    vector = media_items_df.caption_embeddings if is_caption else media_items_df.vector
-    namespace = namespace + "_captions" if is_caption else namespace
+def manifest_path(namespace):
+    return f"./data/manifests/{vector_index.name}_{namespace}.json"
 
-    vectors = zip(
-        media_items_df.id,
-        vector,
-        media_items_df.metadata,
-    )
 
-    pinecone_index.delete(delete_all=True, namespace=namespace)
+def upsert_to_pinecone(namespace, catalog, is_caption=False, sync=True):
+    """
+    Args:
+        catalog: MediaCatalog of the images to index
+        sync: only upsert new or changed vectors and delete removed ones, using
+            the namespace's manifest. When False the namespace is cleared and
+            every vector is upserted again.
+    """
+    if is_caption:
+        # only images that were captioned have a caption embedding, a catalog
+        # indexed without captions empties the namespace
+        rows = catalog.captioned_rows()
+        ids = catalog.ids[rows]
+        vectors = (
+            catalog.caption_vectors[rows]
+            if catalog.caption_vectors is not None
+            else np.empty((0, catalog.vectors.shape[1]), dtype=np.float32)
+        )
+        metadata = [
+            dict(catalog[row].metadata, caption=catalog[row].caption) for row in rows
+        ]
+        namespace = namespace + "_captions"
+    else:
+        ids, vectors, metadata = catalog.ids, catalog.vectors, catalog.metadata()
+
+    if not sync:
+        vector_index.delete(delete_all=True, namespace=namespace)
+        if os.path.exists(manifest_path(namespace)):
+            os.remove(manifest_path(namespace))
 
     # Upsert data with 100 vectors per upsert request asynchronously
-    # - Create pinecone.Index with pool_threads=30 (limits to 30 simultaneous requests)
-    # - Pass async_req=True to index.upsert()
-    with pinecone.Index(index_name=im_index_name, pool_threads=30) as index:
-        # Send requests in parallel
-        async_results = [
-            index.upsert(vectors=ids_vectors_chunk, namespace=namespace, async_req=True)
-            for ids_vectors_chunk in chunks(vectors, batch_size=100)
-        ]
-        # Wait for and retrieve responses (this raises in case of error)
+    # - batch_writer gives a pinecone.Index with pool_threads=30 (limits to 30 simultaneous requests)
+    # - sync_namespace passes async_req=True to index.upsert()
+    with vector_index.batch_writer(pool_threads=30) as index:
         try:
-            [async_result.get() for async_result in async_results]
+            result = sync_namespace(
+                index,
+                namespace,
+                ids,
+                vectors.astype(np.float32).tolist(),
+                metadata,
+                manifest_path(namespace),
+            )
         except Exception as e:
             print(f"Error upserting to Pinecone: {e}")
             st.warning("Error upserting to Pinecone Please try again.")
             st.stop()
+    print(f"Synced {namespace}: {result}")
 
-    while pinecone_index.describe_index_stats()["total_vector_count"] == 0:
-        print(index.describe_index_stats())
+    try:
+        readiness = wait_for_namespace(vector_index, namespace, len(ids))
+        print(f"{namespace} ready: {readiness}")
+    except IndexNotReadyError as e:
+        print(f"Error waiting for Pinecone: {e}")
+        st.warning("Pinecone is still indexing, search results may be incomplete.")
+        readiness = e.result
+    return readiness
 
 
-def click_date_range_button(start_date, end_date):
+def click_date_range_button(start_date, end_date, caption_images=False):
     media_items_df = None
 
     with st.spinner("Fetching Images"):
@@ -175,42 +188,66 @@ def click_date_range_button(start_date, end_date):
         st.warning("No images found in date range")
         return
 
-    media_items_df["metadata"] = media_items_df.loc[
-        :, ["id", "year", "month", "day"]
-    ].to_dict("records")
-
+    num_fetched = len(media_items_df)
     with st.spinner("Embedding Images"):
-        media_items_df = embed_images_with_modal(media_items_df)
+        media_items_df = embed_images_with_modal(media_items_df, captions=caption_images)
+    if len(media_items_df) == 0:
+        # syncing an empty catalog would delete the namespace's vectors
+        st.warning("None of the images could be downloaded, the index was left as is")
+        return
+    if len(media_items_df) < num_fetched:
+        st.warning(
+            f"{num_fetched - len(media_items_df)} images could not be downloaded and were skipped"
+        )
+    # the frame is only needed until the catalog is built
+    catalog = MediaCatalog.from_frame(media_items_df)
+    del media_items_df
 
     with st.spinner("Upserting Images to Vector Store"):
-        upsert_to_pinecone(uid, media_items_df)
-
-    st.info(f"Indexed {len(media_items_df)} images from {start_date} to {end_date} ")
+        readiness = upsert_to_pinecone(uid, catalog)
+        # synced even without captioning, so no caption of an image that left
+        # the catalog is searched
+        upsert_to_pinecone(uid, catalog, is_caption=True)
+
+    st.info(
+        f"Indexed {len(catalog)} images from {start_date} to {end_date}, "
+        f"searchable after {readiness['seconds']:.1f}s"
+    )
 
-    st.session_state["media_items_df"] = media_items_df
+    catalog_registry.publish(uid, catalog)
 
     # Clear Search Journey
     st.session_state["image_results"] = []
     st.session_state["search_journey"] = []
     st.session_state["text_input_query"] = ""
     st.session_state["showing_results"] = False
+    st.session_state.pop("candidate_pool", None)
 
 
 def ui_date_form():
     st.write("Select a date range for the images to index for search")
     start_date = st.date_input("Start Date")
     end_date = st.date_input("End Date")
-    st.button("Confirm", on_click=click_date_range_button, args=[start_date, end_date])
+    caption_images = st.checkbox(
+        "Caption images while indexing",
+        help="Slower to index, but learning from a target image no longer waits on BLIP.",
+    )
+    st.button(
+        "Confirm",
+        on_click=click_date_range_button,
+        args=[start_date, end_date, caption_images],
+    )
 
 st.title("Date Selection")
 col1, col2 = st.columns([2, 1])
-if "media_items_df" in st.session_state:
+catalog = catalog_registry.get(uid)
+if catalog is not None:
     with col1:
-        st.header(f"{len(st.session_state.media_items_df)} Indexed Images")
+        st.header(f"{len(catalog)} Indexed Images")
         st.caption(
             "To index from a different date range, please select a new date range below."
         )
-        st.dataframe(st.session_state["media_items_df"])
+        st.dataframe(catalog.to_frame())
     with col2:
         ui_date_form()
 else:
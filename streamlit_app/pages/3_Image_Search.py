@@ -1,16 +1,27 @@
-import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import numpy as np
 import streamlit as st
 from streamlit_image_select import image_select
 from langchain.llms import OpenAI
 from huggingface_hub import InferenceClient
-from langchain.retrievers import RePhraseQueryRetriever
-from langchain_community.vectorstores import Pinecone
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
-from utils import load_embedder, get_pinecone_image_index
-
-logging.basicConfig()
-logging.getLogger("langchain.retrievers.re_phraser").setLevel(logging.DEBUG)
+from utils import (
+    get_caption_store,
+    get_catalog_registry,
+    get_vector_index,
+    load_query_embedder,
+)
+from photo_urls import caption_url, thumbnail_url
+from query_synthesis import QuerySynthesizer, StubLLMChain
+from search_orchestrator import search_stages
+from ranking import CandidatePool
+from date_filters import combine_filters, date_range_filter, journey_filter
+from learning_queue import LearningQueue
+from hybrid_search import hybrid_query
 
 if "credentials" not in st.session_state or "uid" not in st.session_state:
     st.warning(
@@ -18,16 +29,15 @@ if "credentials" not in st.session_state or "uid" not in st.session_state:
     )
     st.stop()
 
-if "media_items_df" not in st.session_state:
+im_index_name = "photo-captions"
+uid = st.session_state["uid"]
+catalog = get_catalog_registry().get(uid)
+if catalog is None or len(catalog) == 0:
     st.warning(
         "No media items in session, Please go to the Upsert Images page to upload images."
     )
     st.stop()
 
-im_index_name = "photo-captions"
-uid = st.session_state["uid"]
-media_items_df = st.session_state["media_items_df"]
-
 month_names = [
     "NOOP",
     "January",
@@ -64,29 +74,43 @@ that are key for image retrieval, and stripped of any irrelevant details. \
 Synthesized Query:"""
 
 
-@st.cache_resource
-def get_vectorstore(uid, _pinecone_index, _embedder):
-    embed = _embedder
-    text_field = "id"
-    vectorstore = Pinecone(_pinecone_index, embed, text_field, namespace=uid)
-    return vectorstore
-
-
-def init_langchain(uid, _pinecone_index):
-    vectorstore = get_vectorstore(uid, _pinecone_index)
+def init_langchain():
     QUERY_PROMPT = PromptTemplate(
         input_variables=["queries"],
         template=PROMPT,
     )
     llm = OpenAI(temperature=0.1)
     llm_chain = LLMChain(llm=llm, prompt=QUERY_PROMPT)
+    return llm_chain
 
-    retriever_from_llm_chain = RePhraseQueryRetriever(
-        retriever=vectorstore.as_retriever(search_kwargs={"k": 10}),
-        llm_chain=llm_chain,
-        k=50,
+
+@st.cache_resource
+def load_query_synthesizer():
+    """
+    LLM_BACKEND=stub swaps OpenAI for a local stub with STUB_LLM_LATENCY seconds
+    of latency. LLM_TIMEOUT bounds the wait before searching the raw journey,
+    LLM_SKIP_SINGLE_QUERY=0 sends one-query journeys through the LLM too.
+    """
+    if os.getenv("LLM_BACKEND", "openai") == "stub":
+        llm_chain = StubLLMChain(latency=float(os.getenv("STUB_LLM_LATENCY", 1.0)))
+    else:
+        llm_chain = init_langchain()
+    return QuerySynthesizer(
+        llm_chain,
+        timeout=float(os.getenv("LLM_TIMEOUT", 8.0)),
+        skip_single_query=os.getenv("LLM_SKIP_SINGLE_QUERY", "1") == "1",
     )
-    return retriever_from_llm_chain
+
+
+@st.cache_resource
+def load_search_executor():
+    return ThreadPoolExecutor(max_workers=16)
+
+
+@st.cache_resource
+def load_hybrid_executor():
+    # separate from the search executor, whose workers wait on these queries
+    return ThreadPoolExecutor(max_workers=16)
 
 
 @st.cache_resource
@@ -94,6 +118,28 @@ def load_inference():
     return InferenceClient(model="Salesforce/blip-image-captioning-large")
 
 
+@st.cache_resource
+def load_learning_queue():
+    """
+    Embeds and upserts accepted target images in the background. Images
+    captioned at ingestion are looked up, others are captioned with BLIP.
+    """
+    inference = load_inference()
+    caption_store = get_caption_store()
+
+    def caption(media_id, image_url):
+        return caption_store.get(media_id) or inference.image_to_text(
+            image=caption_url(image_url)
+        )
+
+    return LearningQueue(
+        "./data/learnings.db",
+        caption_fn=caption,
+        embed_fn=load_query_embedder().embed_queries,
+        vector_index=get_vector_index(),
+    )
+
+
 if "showing_results" not in st.session_state:
     st.session_state["showing_results"] = False
 
@@ -103,40 +149,163 @@ if "search_journey" not in st.session_state:
 if "image_results" not in st.session_state:
     st.session_state["image_results"] = []
 
-embedder = load_embedder()
-blip_inference = load_inference()
-pinecone_index = get_pinecone_image_index()
-vectorstore: Pinecone = get_vectorstore(uid, pinecone_index, embedder)
-llm_agent = init_langchain(uid, pinecone_index)
+if "pending_search" not in st.session_state:
+    st.session_state["pending_search"] = False
+
+embedder = load_query_embedder()
+learning_queue = load_learning_queue()
+vector_index = get_vector_index()
+query_synthesizer = load_query_synthesizer()
+search_executor = load_search_executor()
+hybrid_executor = load_hybrid_executor()
 row_size = 5
 top_k = 50
+top_k_rephrased = 10
 top_k_fewshot = 10
-
-
-@st.cache_data
-def query_images(search_journey):
+# SEARCH_RANKING=weighted or rrf ranks a per-journey candidate pool locally
+# instead of rephrasing the journey with the LLM
+ranking_method = os.getenv("SEARCH_RANKING", "llm")
+candidate_pool_size = 200
+# Images indexed with captions are searched by image and caption embeddings,
+# caption scores weigh HYBRID_CAPTION_WEIGHT (0 searches images only)
+default_caption_weight = float(os.getenv("HYBRID_CAPTION_WEIGHT", 0.3))
+
+
+def similarity_search(query, k, namespace, filter=None):
+    """Embed query with the CLIP text tower and return the k closest matches in namespace."""
+    query_embedding = embedder.embed_query(query)
+    return vector_index.query(
+        vector=query_embedding,
+        top_k=k,
+        namespace=namespace,
+        filter=filter,
+        include_metadata=True,
+    )["matches"]
+
+
+def search_filter(search_journey):
+    """
+    Date terms in the journey ("beach in june 2022") and the date range
+    controls become a metadata filter for the image search.
+
+    Return:
+        (journey without its date terms, filter or None)
+    """
+    steps, filter = journey_filter(search_journey)
+    date_range = st.session_state.get("date_filter_range")
+    if st.session_state.get("date_filter_enabled") and date_range and len(date_range) == 2:
+        filter = combine_filters(filter, date_range_filter(*date_range))
+    return steps or ["a photo"], filter
+
+
+def fewshot_prompt(search_journey):
+    """LLM prompt for the journey, with the learnings of similar past journeys."""
     queries_string = ", ".join(search_journey)
-    docs = vectorstore.similarity_search(
-        query=queries_string, k=top_k_fewshot, namespace=f"{uid}_fewshot"
-    )
+    matches = similarity_search(queries_string, top_k_fewshot, f"{uid}_fewshot")
     fewshots_query = ""
-    if docs:
+    if matches:
         fewshots_query = "Examples:\n"
-        for doc in docs:
-            fewshots_query += f"{doc.metadata['learnings']}\n"
+        for match in matches:
+            fewshots_query += f"{match['metadata']['learnings']}\n"
     fewshots_query += f"User Queries: {', '.join(search_journey)}\n"
+    return fewshots_query
+
+
+def image_search(query, filter=None, caption_weight=0.0):
+    if caption_weight > 0 and catalog.captions is not None:
+        matches = hybrid_query(
+            vector_index,
+            embedder.embed_query(query),
+            uid,
+            top_k_rephrased,
+            caption_weight=caption_weight,
+            filter=filter,
+            executor=hybrid_executor,
+        )
+    else:
+        matches = similarity_search(query, top_k_rephrased, uid, filter)
+    hits = catalog.hydrate([match["id"] for match in matches])
+    return [(hit.base_url, hit.id) for hit in hits]
 
-    # if len(search_journey) > 1:
-    docs = llm_agent.get_relevant_documents(fewshots_query)
-    # else:
-    #     docs = vectorstore.similarity_search(query=queries_string, k=top_k)
-    results = []
-    for doc in docs:
-        id = doc.page_content
-        image_url = media_items_df.loc[media_items_df["id"] == id, "baseUrl"].iloc[0]
-        results.append((image_url, id))
 
-    return results
+def query_images(search_journey):
+    """
+    Yield the results of the raw journey as soon as they are in, then those of
+    the journey rephrased by the LLM. Both are searched concurrently.
+    """
+    search_journey, filter = search_filter(search_journey)
+    print(f"INFO:3_Image_Search.py: filter: {filter}")
+    for stage, results, timings in search_stages(
+        search_executor,
+        search_journey,
+        # read in this thread, the stages run where session state is not available
+        partial(
+            image_search,
+            filter=filter,
+            caption_weight=st.session_state.get("caption_weight", default_caption_weight),
+        ),
+        fewshot_prompt,
+        query_synthesizer,
+    ):
+        print(f"INFO:3_Image_Search.py: {stage} results, timings: {timings}")
+        yield stage, results, timings
+    print(f"INFO:3_Image_Search.py: query cache: {embedder.cache.stats()}")
+    print(f"INFO:3_Image_Search.py: synthesis: {query_synthesizer.stats()}")
+
+
+def fused_search(search_journey):
+    """
+    Rank the journey's candidate pool by every step of the journey. The pool
+    is retrieved on the first search of a journey, or when its date filter
+    changes; refinements only re-rank it.
+    """
+    start = time.perf_counter()
+    search_journey, filter = search_filter(search_journey)
+    query_vectors = np.array(embedder.embed_queries(search_journey))
+    pool = st.session_state.get("candidate_pool")
+    if pool is None or st.session_state.get("candidate_pool_filter") != filter:
+        pool = CandidatePool.retrieve(
+            vector_index, query_vectors, uid, candidate_pool_size, filter
+        )
+        st.session_state["candidate_pool"] = pool
+        st.session_state["candidate_pool_filter"] = filter
+    ids, _ = pool.rank(query_vectors, top_k_rephrased, ranking_method)
+    results = [(hit.base_url, hit.id) for hit in catalog.hydrate(ids)]
+    seconds = time.perf_counter() - start
+    timings = {"first_results": seconds, "total": seconds, "source": ranking_method}
+    print(f"INFO:3_Image_Search.py: {ranking_method} results, timings: {timings}")
+    return results, timings
+
+
+def run_pending_search():
+    """
+    Show the speculative results while the synthesized ones are on their way.
+    The search runs once: a failure is reported and not retried on the next rerun.
+    """
+    preview = st.empty()
+    try:
+        if ranking_method != "llm":
+            results, timings = fused_search(st.session_state.search_journey)
+            st.session_state.image_results = results
+            st.session_state.search_timings = timings
+            return
+
+        for stage, results, timings in query_images(st.session_state.search_journey):
+            st.session_state.image_results = results
+            st.session_state.search_timings = timings
+            if stage == "speculative":
+                with preview.container():
+                    st.caption("Refining results...")
+                    grid = st.columns(row_size)
+                    for i, (base_url, _) in enumerate(results):
+                        with grid[i % row_size]:
+                            st.image(thumbnail_url(base_url))
+    except Exception as e:
+        print(f"ERROR:3_Image_Search.py: search failed: {e}")
+        st.warning("Search failed, please try again.")
+    finally:
+        preview.empty()
+        st.session_state.pending_search = False
 
 
 def click_search_button(query):
@@ -144,67 +313,71 @@ def click_search_button(query):
         st.warning("Please enter a query to search.")
         return
     st.session_state.search_journey.append(query)
-    st.session_state.image_results = query_images(st.session_state.search_journey)
+    st.session_state.pending_search = True
     st.session_state.showing_results = True
     st.session_state["text_input_query"] = ""
 
 
 def clear_search_journey():
+    st.session_state.pop("search_timings", None)
+    st.session_state.pop("candidate_pool", None)
     st.session_state.image_results = []
     st.session_state.search_journey = []
     st.session_state["text_input_query"] = ""
     st.session_state["showing_results"] = False
 
 
-@st.cache_data
-def get_image_caption(image_url):
-    try:
-        return blip_inference.image_to_text(image=image_url)
-    except Exception as e:
-        st.error(
-            "Google Photos Base URL expired please go to Upsert Images and reupload images."
-        )
-        print(f"Error getting image caption: {e}")
-        st.stop()
-
-
 def learn_from_target_image(image_url_and_id):
-    with st.spinner("Learning"):
-        id = image_url_and_id[1]
-        image_url = image_url_and_id[0]
-        blip_caption = get_image_caption(image_url)
-        queries_string = ", ".join(st.session_state.search_journey)
-        few_shot_example = (
-            f"User Queries: {queries_string} \nSynthesized Query: {blip_caption}"
-        )
-        st.info(f"Learned: {queries_string} -> {blip_caption}")
-        print(f"INFO:3_Image_Search.py: learned: {queries_string} : {blip_caption}")
-
-        caption_embedding = embedder.embed_query(queries_string)
-        pinecone_index.upsert(
-            vectors=[
-                (
-                    id,
-                    caption_embedding,
-                    {"id": image_url_and_id[1], "learnings": few_shot_example},
-                )
-            ],
-            namespace=f"{uid}_fewshot",
-            async_req=True,
-        )
+    image_url, id = image_url_and_id
+    queries_string = ", ".join(st.session_state.search_journey)
+    learning_queue.enqueue(uid, st.session_state.search_journey, id, image_url)
+    depth = learning_queue.stats()["depth"]
+    st.info(f"Learning from {queries_string} in the background ({depth} queued)")
+    print(f"INFO:3_Image_Search.py: queued learning: {queries_string} : {id}")
     clear_search_journey()
 
 
 st.title("Storylines Search")
+learning_stats = learning_queue.stats()
+if catalog.captions is not None:
+    st.sidebar.slider(
+        "Caption weight",
+        min_value=0.0,
+        max_value=1.0,
+        value=default_caption_weight,
+        step=0.05,
+        key="caption_weight",
+        help="How much caption matches count against image matches.",
+    )
+st.sidebar.caption(
+    f"Learning queue: {learning_stats['depth']} pending, {learning_stats['failed']} failed, "
+    f"p95 {learning_stats['latency_p95']:.1f}s to learn"
+)
 query = st.text_input("Search till you find it!", key="text_input_query")
 st.button("Search", on_click=click_search_button, args=[query])
+with st.expander("Filter by date"):
+    st.checkbox("Only search photos taken between", key="date_filter_enabled")
+    st.date_input(
+        "Date range",
+        value=(
+            catalog.creation_times.min().astype("datetime64[D]").astype(object),
+            catalog.creation_times.max().astype("datetime64[D]").astype(object),
+        ),
+        key="date_filter_range",
+    )
+
+if st.session_state.pending_search:
+    run_pending_search()
 
-if st.session_state.showing_results:
+if st.session_state.showing_results and not st.session_state.image_results:
+    st.info("No images found, try refining your search.")
+    st.button("Clear Search Journey", on_click=clear_search_journey)
+elif st.session_state.showing_results:
     col1, col2, col3 = st.columns([1, 3, 1])
     with col2:
         st.header("Most Relevant")
         image_results = st.session_state.image_results
-        images = [x[0] for x in image_results]
+        images = [thumbnail_url(x[0]) for x in image_results]
         selection_id = image_select(
             label="Select your target image",
             images=images,
@@ -213,18 +386,24 @@ if st.session_state.showing_results:
         selection = image_results[selection_id]
     with col1:
         st.header("Target Image")
-        st.image(selection[0])
+        st.image(thumbnail_url(selection[0]))
         st.button("Accept", on_click=learn_from_target_image, args=[selection])
     with col3:
         st.header("Journey")
         search_journey_str = " <li>".join(st.session_state.search_journey)
         st.write(f"<ol><li>{search_journey_str}</ol>", unsafe_allow_html=True)
         st.button("Clear Search Journey", on_click=clear_search_journey)
+        if "search_timings" in st.session_state:
+            timings = st.session_state.search_timings
+            st.caption(
+                f"First results in {timings['first_results']:.2f}s, "
+                f"final in {timings['total']:.2f}s ({timings['source']})"
+            )
 else:
     st.header("Gallery")
     _col1, _col2 = st.columns([1, 2])
     with _col1:
-        num_pages = int(len(media_items_df) / (row_size * (row_size + 1))) + 1
+        num_pages = int(len(catalog) / (row_size * (row_size + 1))) + 1
         page_number = st.number_input(
             label="Page Number", min_value=1, max_value=num_pages, value=1, step=1
         )
@@ -237,8 +416,8 @@ else:
     batch_size = row_size * row_size
     start = (page_number - 1) * batch_size
     end = start + batch_size
-    batch = media_items_df["baseUrl"].values[start:end]
+    batch = catalog.base_urls[start:end]
     for i, image in enumerate(batch):
         with grid[col]:
-            st.image(image)
+            st.image(thumbnail_url(image))
         col = (col + 1) % row_size
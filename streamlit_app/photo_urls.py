@@ -0,0 +1,44 @@
+# Google Photos base URLs take sizing parameters, so each consumer downloads
+# only the pixels it needs instead of the original photo.
+# (https://developers.google.com/photos/library/guides/access-media-items#image-base-urls)
+
+# CLIP ViT-B/32 resizes the short side to 224 and center crops to 224x224
+EMBED_SIZE = 224
+# BLIP large captions at 384x384
+CAPTION_SIZE = 384
+# Gallery and result grid tiles
+THUMBNAIL_SIZE = 512
+
+
+def sized_url(base_url, width, height=None, crop=False):
+    """
+    Args:
+        base_url: baseUrl of a media item
+        width, height: bounding box the image is scaled down to fit in
+        crop: crop to exactly width x height instead of fitting inside it
+    Return:
+        url for the resized image bytes
+    """
+    height = height or width
+    url = f"{base_url}=w{width}-h{height}"
+    if crop:
+        url += "-c"
+    return url
+
+
+def embed_url(base_url):
+    return sized_url(base_url, EMBED_SIZE, crop=True)
+
+
+def caption_url(base_url):
+    return sized_url(base_url, CAPTION_SIZE)
+
+
+def thumbnail_url(base_url):
+    return sized_url(base_url, THUMBNAIL_SIZE)
+
+
+def fetch_bytes(session, url, timeout=30):
+    res = session.get(url, timeout=timeout)
+    res.raise_for_status()
+    return res.content
@@ -0,0 +1,205 @@
+import json
+import time
+import queue
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SEARCH_URL = "https://photoslibrary.googleapis.com/v1/mediaItems:search"
+# mediaItems:search caps pageSize at 100
+PAGE_SIZE = 100
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """Thread-safe token bucket shared by all listing workers."""
+
+    def __init__(self, rate, burst=None):
+        """
+        Args:
+            rate: requests per second allowed on average, None for no limit
+            burst: number of requests that may be sent back to back
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate or 1))
+        self.tokens = float(self.burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.last) * self.rate
+                )
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_session(pool_size=10):
+    """A requests session whose connection pool fits pool_size workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def date_windows(sdate, edate, window_days=7):
+    """
+    Split [sdate, edate) into inclusive (start, end) windows of window_days days,
+    which is the shape dateFilter.ranges expects.
+    """
+    start = sdate
+    while start < edate:
+        end = min(start + timedelta(days=window_days), edate)
+        yield start, end - timedelta(days=1)
+        start = end
+
+
+def _date_json(d):
+    return {"year": d.year, "month": d.month, "day": d.day}
+
+
+class MediaItemLister:
+    """
+    Lists media items of a date range through mediaItems:search.
+
+    The range is split into windows that are fetched concurrently, each window
+    following nextPageToken until it is exhausted. Items are streamed back as
+    soon as their page arrives, so callers never wait for the whole range.
+    """
+
+    def __init__(
+        self,
+        token,
+        search_url=SEARCH_URL,
+        max_workers=8,
+        window_days=7,
+        requests_per_second=10,
+        max_retries=5,
+        backoff=0.5,
+        session=None,
+    ):
+        self.token = token
+        self.search_url = search_url
+        self.max_workers = max_workers
+        self.window_days = window_days
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.session = session or make_session(max_workers)
+        self.requests_made = 0
+        self._count_lock = threading.Lock()
+
+    def _post(self, payload):
+        headers = {
+            "content-type": "application/json",
+            "Authorization": "Bearer {}".format(self.token),
+        }
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            with self._count_lock:
+                self.requests_made += 1
+            try:
+                res = self.session.post(
+                    self.search_url, data=json.dumps(payload), headers=headers
+                )
+            except requests.ConnectionError:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+                continue
+
+            if res.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                retry_after = res.headers.get("Retry-After")
+                delay = self.backoff * 2**attempt
+                if retry_after is not None and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                time.sleep(delay)
+                continue
+            res.raise_for_status()
+            return res.json()
+
+    def iter_pages(self, start, end):
+        """Yield every page of media items created between start and end inclusive."""
+        payload = {
+            "pageSize": PAGE_SIZE,
+            "filters": {
+                "dateFilter": {
+                    "ranges": [
+                        {"startDate": _date_json(start), "endDate": _date_json(end)}
+                    ]
+                }
+            },
+        }
+        while True:
+            body = self._post(payload)
+            items = body.get("mediaItems", [])
+            if items:
+                yield items
+            page_token = body.get("nextPageToken")
+            if not page_token:
+                return
+            payload["pageToken"] = page_token
+
+    def stream(self, sdate, edate):
+        """
+        Args:
+            sdate: first day of the range
+            edate: day after the last day of the range
+        Return:
+            generator over the raw media item dicts in the range, in arrival order
+        """
+        windows = list(date_windows(sdate, edate, self.window_days))
+        if not windows:
+            return
+        pages = queue.Queue(maxsize=self.max_workers * 4)
+        cancelled = threading.Event()
+        done = object()
+
+        def put(page):
+            while not cancelled.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def worker(window):
+            try:
+                for page in self.iter_pages(*window):
+                    if not put(page):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            for window in windows:
+                executor.submit(worker, window)
+            remaining = len(windows)
+            while remaining:
+                page = pages.get()
+                if page is done:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield from page
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=True, cancel_futures=True)
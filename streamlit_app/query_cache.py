@@ -0,0 +1,125 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Per-entry bookkeeping on top of the vector and the key text: OrderedDict
+# node, key tuple and the entry tuple
+_ENTRY_OVERHEAD = 256
+
+
+def normalize_query(text):
+    """CLIP's tokenizer lowercases and collapses whitespace, so these embed alike."""
+    return " ".join(text.lower().split())
+
+
+class TextEmbeddingCache:
+    """
+    In-memory LRU cache of text embeddings with a time to live.
+
+    Entries are keyed by model name and normalized text. The least recently
+    used entries are evicted once the cache holds more than max_bytes, and
+    entries older than ttl seconds are treated as misses.
+    """
+
+    def __init__(self, max_bytes=16 * 2**20, ttl=24 * 3600, clock=time.monotonic):
+        """
+        Args:
+            max_bytes: bound on the memory held by vectors, keys and bookkeeping
+            ttl: seconds an embedding stays valid, None to keep it until evicted
+            clock: time source, monotonic seconds
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _entry_bytes(key, vector):
+        return vector.nbytes + sys.getsizeof(key[1]) + _ENTRY_OVERHEAD
+
+    def _drop(self, key):
+        _, vector = self.entries.pop(key)
+        self.bytes -= self._entry_bytes(key, vector)
+
+    def get(self, model_name, text):
+        """Cached embedding of text as a float32 array, None on a miss."""
+        key = (model_name, normalize_query(text))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None:
+                if self.clock() - entry[0] > self.ttl:
+                    self._drop(key)
+                    self.expirations += 1
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, model_name, text, vector):
+        key = (model_name, normalize_query(text))
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (self.clock(), vector)
+            self.bytes += self._entry_bytes(key, vector)
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class CachedQueryEmbedder:
+    """Wraps an embedder's embed_query with a TextEmbeddingCache."""
+
+    def __init__(self, embedder, model_name, cache):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_query(self, text):
+        vector = self.cache.get(self.model_name, text)
+        if vector is None:
+            vector = self.embedder.embed_query(normalize_query(text))
+            self.cache.put(self.model_name, text, vector)
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    def embed_queries(self, texts):
+        """embed_query for many texts, with the misses encoded in one batch."""
+        vectors = [self.cache.get(self.model_name, text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self.embedder.embed_documents(
+                [normalize_query(texts[i]) for i in missing]
+            )
+            for i, vector in zip(missing, embedded):
+                self.cache.put(self.model_name, texts[i], vector)
+                vectors[i] = vector
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+def raw_journey_query(search_journey):
+    """The journey as a single query, what the image search falls back to."""
+    return ", ".join(search_journey)
+
+
+class StubLLMChain:
+    """
+    Stand-in for the LLMChain with a fixed latency, for benchmarks and offline
+    runs. It answers with the user queries of the prompt, joined.
+    """
+
+    def __init__(self, latency=1.0):
+        self.latency = latency
+        self.calls = 0
+
+    def predict(self, queries):
+        self.calls += 1
+        time.sleep(self.latency)
+        user_queries = queries.rsplit("User Queries:", 1)[-1]
+        return " ".join(user_queries.split())
+
+
+class QuerySynthesizer:
+    """
+    Rephrase a search journey into one query with an LLM chain.
+
+    Completions are cached by the exact prompt, so a journey that was already
+    synthesized with the same few-shot examples never calls the LLM again.
+    One-query journeys can skip the LLM altogether, and a completion that does
+    not arrive within timeout seconds is abandoned in favour of the raw journey;
+    it is still cached when it finishes, so the next identical search hits.
+    """
+
+    def __init__(
+        self, llm_chain, max_entries=1024, timeout=8.0, skip_single_query=True, workers=4
+    ):
+        """
+        Args:
+            llm_chain: anything with predict(queries=prompt), e.g. LLMChain or StubLLMChain
+            max_entries: completions kept in the LRU cache
+            timeout: seconds to wait for the LLM, None to wait indefinitely
+            skip_single_query: search a one-query journey as typed
+            workers: concurrent LLM calls
+        """
+        self.llm_chain = llm_chain
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.skip_single_query = skip_single_query
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.completions = OrderedDict()
+        self.pending = {}
+        # reentrant: a future that is already done runs its callback in _submit
+        self.lock = threading.RLock()
+        self.counts = {"cache": 0, "llm": 0, "skipped": 0, "timeout": 0, "error": 0}
+
+    def _store(self, prompt, completion):
+        with self.lock:
+            self.completions[prompt] = completion
+            self.completions.move_to_end(prompt)
+            while len(self.completions) > self.max_entries:
+                self.completions.popitem(last=False)
+
+    def _complete(self, prompt):
+        completion = self.llm_chain.predict(queries=prompt).strip()
+        self._store(prompt, completion)
+        return completion
+
+    def _submit(self, prompt):
+        """One LLM call per prompt, however many searches are waiting on it."""
+        with self.lock:
+            future = self.pending.get(prompt)
+            if future is None:
+                future = self.executor.submit(self._complete, prompt)
+                self.pending[prompt] = future
+                future.add_done_callback(lambda _: self._forget(prompt))
+            return future
+
+    def _forget(self, prompt):
+        with self.lock:
+            self.pending.pop(prompt, None)
+
+    def _count(self, source):
+        with self.lock:
+            self.counts[source] += 1
+
+    def synthesize(self, prompt, search_journey):
+        """
+        Args:
+            prompt: the full prompt, few-shot examples plus the journey
+            search_journey: the user's queries, used when the LLM is skipped
+        Return:
+            (query, source) where source is one of cache, llm, skipped, timeout
+            or error; for the last three query is the raw journey
+        """
+        if self.skip_single_query and len(search_journey) == 1:
+            self._count("skipped")
+            return search_journey[0], "skipped"
+
+        with self.lock:
+            completion = self.completions.get(prompt)
+            if completion is not None:
+                self.completions.move_to_end(prompt)
+                self.counts["cache"] += 1
+                return completion, "cache"
+
+        future = self._submit(prompt)
+        try:
+            completion = future.result(timeout=self.timeout)
+        except TimeoutError:
+            self._count("timeout")
+            return raw_journey_query(search_journey), "timeout"
+        except Exception as e:
+            print(f"query_synthesis.py:: LLM synthesis failed: {e}")
+            self._count("error")
+            return raw_journey_query(search_journey), "error"
+        self._count("llm")
+        return completion, "llm"
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, cached=len(self.completions))
@@ -0,0 +1,86 @@
+import numpy as np
+
+FUSION_METHODS = ("weighted", "rrf")
+
+
+def _unit_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def journey_weights(steps, decay=0.6):
+    """Later refinements say more about the target: step i weighs decay ** (steps - 1 - i)."""
+    weights = decay ** np.arange(steps - 1, -1, -1, dtype=np.float32)
+    return weights / weights.sum()
+
+
+def fuse(query_vectors, candidate_vectors, method="weighted", weights=None, rrf_k=60):
+    """
+    Fuse the similarity of each candidate to every journey step into one score.
+
+    Args:
+        query_vectors: (steps, dim) embeddings of the journey steps
+        candidate_vectors: (candidates, dim) image embeddings
+        method: "weighted" sums the cosine similarities with weights, "rrf"
+            sums weights / (rrf_k + rank) over each step's ranking
+        weights: per-step weights, journey_weights by default
+    Return:
+        (order, scores): candidate rows best first, and their fused scores
+    """
+    queries = _unit_rows(query_vectors)
+    candidates = _unit_rows(candidate_vectors)
+    if weights is None:
+        weights = journey_weights(len(queries))
+    weights = np.asarray(weights, dtype=np.float32)
+
+    similarity = candidates @ queries.T
+    if method == "weighted":
+        fused = similarity @ weights
+    elif method == "rrf":
+        # rank of each candidate in each step's ranking, 0 is best
+        ranks = np.argsort(np.argsort(-similarity, axis=0, kind="stable"), axis=0)
+        fused = (weights / (rrf_k + 1 + ranks)).sum(axis=1)
+    else:
+        raise ValueError(f"Unknown fusion method {method}, expected one of {FUSION_METHODS}")
+    order = np.argsort(-fused, kind="stable")
+    return order, fused[order]
+
+
+class CandidatePool:
+    """
+    Candidates fetched from the vector index once per journey, with their
+    embeddings, so refinements re-rank locally instead of querying again.
+    """
+
+    def __init__(self, ids, vectors):
+        self.ids = np.asarray(ids, dtype=object)
+        self.vectors = _unit_rows(vectors) if len(ids) else np.empty((0, 0), np.float32)
+
+    @classmethod
+    def retrieve(cls, vector_index, query_vectors, namespace, top_k=200, filter=None):
+        """One query with the mean of the journey steps, returning values."""
+        centroid = _unit_rows(query_vectors).mean(axis=0)
+        matches = vector_index.query(
+            vector=centroid.tolist(),
+            top_k=top_k,
+            namespace=namespace,
+            filter=filter,
+            include_metadata=False,
+            include_values=True,
+        )["matches"]
+        return cls(
+            [match["id"] for match in matches], [match["values"] for match in matches]
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rank(self, query_vectors, k, method="weighted", weights=None):
+        """Ids of the k best candidates for the journey, with their fused scores."""
+        if len(self) == 0:
+            return [], np.empty(0, dtype=np.float32)
+        order, scores = fuse(query_vectors, self.vectors, method, weights)
+        return self.ids[order[:k]].tolist(), scores[:k]
@@ -0,0 +1,56 @@
+import time
+
+from query_synthesis import raw_journey_query
+
+
+def _timed(timings, stage, fn, *args):
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def search_stages(executor, search_journey, image_search, fewshot_prompt, synthesizer):
+    """
+    Run a journey's searches concurrently, yielding results as they improve.
+
+    The raw journey is searched speculatively while the few-shot examples are
+    fetched and the LLM rephrases the journey. The speculative results are
+    yielded first; the synthesized query's results follow once the rephrase
+    and its image search are done. When the synthesized query is the raw
+    journey (the LLM was skipped, timed out or failed) the speculative results
+    are final and no second search is made.
+
+    Args:
+        executor: concurrent.futures executor the stages run on
+        image_search: query -> results
+        fewshot_prompt: search_journey -> LLM prompt with few-shot examples
+        synthesizer: QuerySynthesizer
+    Yield:
+        (stage, results, timings) with stage "speculative" then "synthesized";
+        timings maps each finished stage to its seconds, plus total and source
+    """
+    timings = {}
+    start = time.perf_counter()
+    raw_query = raw_journey_query(search_journey)
+
+    def rephrase():
+        prompt = _timed(timings, "fewshot", fewshot_prompt, search_journey)
+        return _timed(timings, "llm", synthesizer.synthesize, prompt, search_journey)
+
+    speculative = executor.submit(_timed, timings, "speculative_search", image_search, raw_query)
+    rephrased = executor.submit(rephrase)
+
+    speculative_results = speculative.result()
+    timings["first_results"] = time.perf_counter() - start
+    yield "speculative", speculative_results, dict(timings)
+
+    synthesized_query, source = rephrased.result()
+    timings["source"] = source
+    if synthesized_query == raw_query:
+        results = speculative_results
+    else:
+        results = _timed(timings, "synthesized_search", image_search, synthesized_query)
+    timings["total"] = time.perf_counter() - start
+    yield "synthesized", results, dict(timings)
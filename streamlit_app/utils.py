@@ -4,15 +4,33 @@ import streamlit as st
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
 from langchain.embeddings import HuggingFaceEmbeddings
+from embedding_cache import EmbeddingCache
+from caption_store import CAPTION_MODEL_NAME, CaptionStore
+from media_catalog import CatalogRegistry
+from query_cache import CachedQueryEmbedder, TextEmbeddingCache
+from vector_store import LocalVectorStore, PineconeVectorStore
 
 im_index_name = "photo-captions"
+# Model ModalEmbedding embeds images with, keys the embedding cache
+image_model_name = "sentence-transformers/clip-ViT-B-32"
+# Text tower load_embedder uses, keys the query embedding cache
+text_model_name = "clip-Vit-B-32"
 @st.cache_resource
 def load_model():
     return SentenceTransformer("clip-ViT-B-32")
 
 @st.cache_resource
 def load_embedder():
-    return HuggingFaceEmbeddings(model_name="clip-Vit-B-32")
+    return HuggingFaceEmbeddings(model_name=text_model_name)
+
+@st.cache_resource
+def get_query_cache():
+    return TextEmbeddingCache()
+
+@st.cache_resource
+def load_query_embedder():
+    """load_embedder with query embeddings cached across every session."""
+    return CachedQueryEmbedder(load_embedder(), text_model_name, get_query_cache())
 
 @st.cache_resource
 def get_pinecone_image_index():
@@ -24,3 +42,35 @@ def get_pinecone_image_index():
     if im_index_name not in pinecone.list_indexes():
         pinecone.create_index(name=im_index_name, dimension=512, metric="cosine")
     return pinecone.Index(im_index_name)
+
+
+@st.cache_resource
+def get_vector_index():
+    """
+    The image vector index, hosted Pinecone unless VECTOR_BACKEND=local selects
+    the in-process index persisted under data/vectors. VECTOR_INDEX_TYPE=ivf
+    and IVF_NPROBE switch the local index to approximate search.
+    """
+    load_dotenv()
+    if os.getenv("VECTOR_BACKEND", "pinecone") == "local":
+        return LocalVectorStore(
+            "./data/vectors",
+            dim=512,
+            index_type=os.getenv("VECTOR_INDEX_TYPE", "exact"),
+            nprobe=int(os.getenv("IVF_NPROBE", 8)),
+        )
+    return PineconeVectorStore(im_index_name, get_pinecone_image_index())
+
+@st.cache_resource
+def get_embedding_cache():
+    return EmbeddingCache("./data/embeddings", image_model_name)
+
+@st.cache_resource
+def get_caption_store():
+    """BLIP captions generated at ingestion, by media item id."""
+    return CaptionStore("./data/captions.db", CAPTION_MODEL_NAME)
+
+@st.cache_resource
+def get_catalog_registry():
+    """Indexed media catalogs by uid, shared by every session of the same user."""
+    return CatalogRegistry()
@@ -1,5 +1,9 @@
 from modal import Stub, Image, method
 
+from clip_embedding import BatchedEmbedder
+from blip_captioning import CAPTION_MODEL_NAME, BatchedCaptioner
+from image_pipeline import embed_media_items_df
+
 stub = Stub()
 
 def download_models():
@@ -7,11 +11,13 @@ def download_models():
     from sentence_transformers import SentenceTransformer
 
     SentenceTransformer("sentence-transformers/clip-ViT-B-32")
+    BatchedCaptioner.from_pretrained(CAPTION_MODEL_NAME)
 
 container_image = (
     Image.debian_slim()
     .pip_install("sentence-transformers")
     .pip_install("pandas")
+    .pip_install("Pillow", "requests")
     .run_function(download_models)
 )
 
@@ -24,28 +30,36 @@ class ModalEmbedding:
         from sentence_transformers import SentenceTransformer
 
         self.model = SentenceTransformer("sentence-transformers/clip-ViT-B-32")
+        # BLIP is only loaded once a caller asks for captions
+        self.captioner = None
 
     @method()
-    def generate(self, media_items_df):
-        from tqdm import tqdm
-        import pandas as pd
-
-        # Generate embeddings for each image
-        # with open(f'/root/instance/embeddings.json', 'r') as json_file:
-        embeddings = []
-        url_list = media_items_df["baseUrl"].values.tolist()
-        for url in tqdm(url_list, desc="Generating embeddings"):
-            from PIL import Image
-            import requests
-
-            try:
-                image = Image.open(requests.get(url, stream=True).raw)
-            except Exception as e:
-                print(f"Error opening image {url}, error: {e}")
-                image = None
-
-            img_emb = self.model.encode(image).tolist()
-            embeddings.append(img_emb)
-        media_items_df["vector"] = embeddings
+    def generate(self, media_items_df, batch_size=64, num_threads=None, captions=False):
+        """
+        Args:
+            batch_size: images per CLIP forward pass
+            num_threads: torch threads, torch's default (the container's cores)
+                when None
+            captions: also caption every image with BLIP, in a caption column
+        """
+        embedder = BatchedEmbedder(
+            self.model, batch_size=batch_size, num_threads=num_threads
+        )
+        # Download, decode and embed the images in a bounded pipeline, rows whose
+        # image could not be fetched are dropped instead of embedded
+        caption_fn = None
+        if captions:
+            if self.captioner is None:
+                self.captioner = BatchedCaptioner.from_pretrained(CAPTION_MODEL_NAME)
+            caption_fn = self.captioner
+        media_items_df, failed = embed_media_items_df(
+            media_items_df, embedder, caption_fn=caption_fn, batch_size=batch_size
+        )
+        print(
+            f"Embedded {len(media_items_df)} images, skipped {len(failed)}, "
+            f"{embedder.images_per_second():.1f} images/sec"
+        )
+        if captions:
+            print(f"Captioned {self.captioner.images_per_second():.1f} images/sec")
 
         return media_items_df
@@ -0,0 +1,450 @@
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pinecone
+
+from ann_index import IVFIndex
+
+# Metadata fields the local backend can filter on, stored as integer columns
+FILTER_FIELDS = ("year", "month", "day")
+
+_FILTER_OPS = {
+    "$eq": lambda column, value: column == value,
+    "$ne": lambda column, value: column != value,
+    "$gt": lambda column, value: column > value,
+    "$gte": lambda column, value: column >= value,
+    "$lt": lambda column, value: column < value,
+    "$lte": lambda column, value: column <= value,
+    "$in": lambda column, value: np.isin(column, value),
+    "$nin": lambda column, value: ~np.isin(column, value),
+}
+
+
+class CompletedRequest:
+    """Mimics the ApplyResult pinecone returns from async_req calls."""
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def _as_query_vector(vector):
+    # LangChain style callers pass [embedding] rather than embedding
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector.reshape(-1)
+
+
+def filter_mask(filter, columns):
+    """
+    Evaluate a Pinecone metadata filter over integer metadata columns.
+
+    Args:
+        filter: e.g. {"year": 2023, "month": {"$in": [2, 3]}}
+        columns: int array of shape (n, len(FILTER_FIELDS))
+    Return:
+        bool array of the n rows that match
+    """
+    mask = np.ones(len(columns), dtype=bool)
+    for key, condition in filter.items():
+        if key == "$and":
+            for sub_filter in condition:
+                mask &= filter_mask(sub_filter, columns)
+        elif key == "$or":
+            any_mask = np.zeros(len(columns), dtype=bool)
+            for sub_filter in condition:
+                any_mask |= filter_mask(sub_filter, columns)
+            mask &= any_mask
+        elif key in FILTER_FIELDS:
+            column = columns[:, FILTER_FIELDS.index(key)]
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                mask &= _FILTER_OPS[op](column, value)
+        else:
+            raise ValueError(f"Can only filter on {FILTER_FIELDS}, got {key}")
+    return mask
+
+
+def month_filter(filter):
+    """
+    A filter on year and month only, matching every month in which filter can
+    match some day: conditions on day are dropped, which can only widen it.
+    """
+    if isinstance(filter, dict):
+        return {
+            key: month_filter(condition) if key in ("$and", "$or") else condition
+            for key, condition in filter.items()
+            if key != "day"
+        }
+    return [month_filter(sub_filter) for sub_filter in filter]
+
+
+class PineconeVectorStore:
+    """Adapter giving a hosted Pinecone index the VectorStore surface."""
+
+    def __init__(self, index_name, index=None):
+        self.name = index_name
+        self.index_name = index_name
+        self.index = index or pinecone.Index(index_name)
+
+    def upsert(self, vectors, namespace="", async_req=False):
+        return self.index.upsert(vectors=vectors, namespace=namespace, async_req=async_req)
+
+    def query(
+        self,
+        vector,
+        top_k=10,
+        namespace="",
+        filter=None,
+        include_metadata=True,
+        include_values=False,
+    ):
+        response = self.index.query(
+            vector=list(map(float, _as_query_vector(vector))),
+            top_k=top_k,
+            namespace=namespace,
+            filter=filter,
+            include_metadata=include_metadata,
+            include_values=include_values,
+        )
+        matches = []
+        for match in response["matches"]:
+            result = {"id": match["id"], "score": match["score"]}
+            if include_metadata:
+                result["metadata"] = match.get("metadata") or {}
+            if include_values:
+                result["values"] = match.get("values")
+            matches.append(result)
+        return {"matches": matches, "namespace": namespace}
+
+    def delete(self, ids=None, delete_all=False, namespace=""):
+        if delete_all:
+            return self.index.delete(delete_all=True, namespace=namespace)
+        return self.index.delete(ids=ids, namespace=namespace)
+
+    def describe_index_stats(self):
+        return self.index.describe_index_stats()
+
+    def flush(self):
+        pass
+
+    @contextmanager
+    def batch_writer(self, pool_threads=30):
+        """A store whose index sends up to pool_threads async requests at once."""
+        with pinecone.Index(index_name=self.index_name, pool_threads=pool_threads) as index:
+            yield PineconeVectorStore(self.index_name, index)
+
+
+class _Namespace:
+    """One namespace of a LocalVectorStore: a contiguous matrix of unit vectors."""
+
+    def __init__(self, dim, dtype, ann=None):
+        self.dim = dim
+        self.dtype = dtype
+        self.ann = ann
+        self.count = 0
+        self.ids = []
+        self.rows = {}
+        self.metadata = []
+        self.matrix = np.empty((0, dim), dtype=dtype)
+        self.columns = np.empty((0, len(FILTER_FIELDS)), dtype=np.int32)
+        self.dirty = False
+        self._shards = None
+
+    def _reserve(self, count):
+        capacity = self.matrix.shape[0]
+        if count <= capacity and self.matrix.flags.writeable:
+            return
+        if count > capacity:
+            capacity = max(count, capacity * 2, 1024)
+        matrix = np.empty((capacity, self.dim), dtype=self.dtype)
+        matrix[: self.count] = self.matrix[: self.count]
+        columns = np.full((capacity, len(FILTER_FIELDS)), -1, dtype=np.int32)
+        columns[: self.count] = self.columns[: self.count]
+        self.matrix, self.columns = matrix, columns
+
+    def upsert(self, records):
+        ids = [record[0] for record in records]
+        values = np.asarray([record[1] for record in records], dtype=np.float32)
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values /= np.where(norms == 0, 1, norms)
+
+        rows = []
+        new_count = self.count + sum(1 for media_id in ids if media_id not in self.rows)
+        self._reserve(new_count)
+        for media_id, _, metadata in records:
+            row = self.rows.get(media_id)
+            if row is None:
+                row = self.count
+                self.rows[media_id] = row
+                self.ids.append(media_id)
+                self.metadata.append(metadata)
+                self.count += 1
+            else:
+                self.metadata[row] = metadata
+            rows.append(row)
+            self.columns[row] = [
+                (metadata or {}).get(field, -1) for field in FILTER_FIELDS
+            ]
+        self.matrix[rows] = values
+        if self.ann is not None:
+            self.ann.add(rows, values)
+            self.ann.maybe_train(self.matrix[: self.count])
+        self.dirty = True
+        self._shards = None
+
+    def delete(self, ids):
+        self._reserve(self.count)
+        for media_id in ids:
+            row = self.rows.pop(media_id, None)
+            if row is None:
+                continue
+            # keep rows contiguous by moving the last row into the hole
+            last = self.count - 1
+            if row != last:
+                moved_id = self.ids[last]
+                self.matrix[row] = self.matrix[last]
+                self.columns[row] = self.columns[last]
+                self.ids[row] = moved_id
+                self.metadata[row] = self.metadata[last]
+                self.rows[moved_id] = row
+                if self.ann is not None:
+                    self.ann.move(last, row)
+            elif self.ann is not None:
+                self.ann.remove(last)
+            self.ids.pop()
+            self.metadata.pop()
+            self.count -= 1
+        self.dirty = True
+        self._shards = None
+
+    def scores(self, query, rows=None):
+        """Cosine similarity of query against all rows, or the given rows."""
+        matrix = self.matrix[: self.count] if rows is None else self.matrix[rows]
+        if matrix.dtype == np.float32:
+            return matrix @ query
+        scores = np.empty(len(matrix), dtype=np.float32)
+        block = 65536
+        for start in range(0, len(matrix), block):
+            scores[start : start + block] = (
+                matrix[start : start + block].astype(np.float32) @ query
+            )
+        return scores
+
+    def _build_shards(self):
+        """Partition the rows by (year, month): row order plus offsets per month."""
+        columns = self.columns[: self.count]
+        month_key = columns[:, 0].astype(np.int64) * 100 + columns[:, 1]
+        order = np.argsort(month_key, kind="stable")
+        keys, starts = np.unique(month_key[order], return_index=True)
+        shard_columns = np.full((len(keys), len(FILTER_FIELDS)), -1, dtype=np.int32)
+        shard_columns[:, 0] = keys // 100
+        shard_columns[:, 1] = keys % 100
+        offsets = np.append(starts, len(order))
+        self._shards = (shard_columns, order, offsets)
+
+    def filtered_rows(self, filter):
+        """Rows matching filter, checking only the month shards it can match."""
+        if self._shards is None:
+            self._build_shards()
+        shard_columns, order, offsets = self._shards
+        shards = np.flatnonzero(filter_mask(month_filter(filter), shard_columns))
+        if len(shards) == 0:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate([order[offsets[s] : offsets[s + 1]] for s in shards])
+        return rows[filter_mask(filter, self.columns[rows])]
+
+    def search(self, query, top_k, filter=None, nprobe=None):
+        query = query / (np.linalg.norm(query) or 1)
+        rows = None
+        if filter:
+            # filtered queries scan only the matching rows, exactly
+            rows = self.filtered_rows(filter)
+        elif self.ann is not None and self.ann.is_trained:
+            rows = self.ann.candidates(query, self.count, nprobe)
+        scores = self.scores(query, rows)
+        k = min(top_k, len(scores))
+        if k == 0:
+            return [], []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        found = best if rows is None else rows[best]
+        return found, scores[best]
+
+    def save(self, path, name):
+        os.makedirs(path, exist_ok=True)
+        ivf_path = os.path.join(path, "ivf.npz")
+        if self.ann is not None and self.ann.is_trained:
+            self.ann.save(os.path.join(path, "ivf.tmp.npz"), self.count)
+            os.replace(os.path.join(path, "ivf.tmp.npz"), ivf_path)
+        elif os.path.exists(ivf_path):
+            # emptied or rebuilt below min_train_rows, the old buckets are stale
+            os.remove(ivf_path)
+        np.save(os.path.join(path, "vectors.tmp.npy"), self.matrix[: self.count])
+        np.save(os.path.join(path, "columns.tmp.npy"), self.columns[: self.count])
+        with open(os.path.join(path, "items.tmp.json"), "w") as items_file:
+            json.dump(
+                {"namespace": name, "ids": self.ids, "metadata": self.metadata},
+                items_file,
+            )
+        for name in ("vectors.npy", "columns.npy", "items.json"):
+            stem, ext = os.path.splitext(name)
+            os.replace(os.path.join(path, f"{stem}.tmp{ext}"), os.path.join(path, name))
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path, dim, dtype, ann=None):
+        namespace = cls(dim, dtype, ann)
+        # memory-mapped until the first write copies it into RAM
+        namespace.matrix = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        namespace.columns = np.load(os.path.join(path, "columns.npy"), mmap_mode="r")
+        with open(os.path.join(path, "items.json")) as items_file:
+            items = json.load(items_file)
+        namespace.ids = items["ids"]
+        namespace.metadata = items["metadata"]
+        namespace.rows = {media_id: row for row, media_id in enumerate(namespace.ids)}
+        namespace.count = len(namespace.ids)
+        ivf_path = os.path.join(path, "ivf.npz")
+        if ann is not None:
+            if os.path.exists(ivf_path) and not ann.load(ivf_path, namespace.count):
+                print(f"vector_store.py:: ignoring stale {ivf_path}")
+            # retrain when no matching index was saved and the namespace is large
+            ann.maybe_train(namespace.matrix[: namespace.count])
+        return items["namespace"], namespace
+
+
+class LocalVectorStore:
+    """
+    In-process vector index with the same upsert/query/delete surface as
+    pinecone.Index, doing cosine search over one NumPy matrix per namespace.
+    Search is exact unless index_type="ivf", which puts an IVFIndex in front of
+    each namespace once it is large enough. Filtered queries are exact over the
+    matching rows, found through a per-month partition of each namespace so
+    only the months a filter can match are checked. Namespaces are persisted
+    under root_dir by flush() and loaded memory-mapped.
+    """
+
+    def __init__(
+        self,
+        root_dir,
+        dim=512,
+        dtype=np.float32,
+        index_type="exact",
+        nprobe=8,
+        min_train_rows=10000,
+    ):
+        """
+        Args:
+            dtype: np.float32, or np.float16 to halve memory
+            index_type: "exact" or "ivf"
+            nprobe: IVF buckets scanned per query
+            min_train_rows: namespaces smaller than this are searched exactly
+        """
+        self.name = "local"
+        self.root_dir = root_dir
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.min_train_rows = min_train_rows
+        self.namespaces = {}
+        self.lock = threading.RLock()
+        os.makedirs(root_dir, exist_ok=True)
+        for name in os.listdir(root_dir):
+            path = os.path.join(root_dir, name)
+            if os.path.exists(os.path.join(path, "items.json")):
+                namespace, ns = _Namespace.load(path, dim, self.dtype, self._new_ann())
+                self.namespaces[namespace] = ns
+
+    def _new_ann(self):
+        if self.index_type == "ivf":
+            return IVFIndex(nprobe=self.nprobe, min_train_rows=self.min_train_rows)
+        if self.index_type != "exact":
+            raise ValueError(f"Unknown index_type {self.index_type}")
+        return None
+
+    def _new_namespace(self):
+        return _Namespace(self.dim, self.dtype, self._new_ann())
+
+    @staticmethod
+    def _dir_name(namespace):
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", namespace) or "_default"
+
+    def _namespace(self, namespace, create=False):
+        if namespace not in self.namespaces and create:
+            self.namespaces[namespace] = self._new_namespace()
+        return self.namespaces.get(namespace)
+
+    def upsert(self, vectors, namespace="", async_req=False):
+        records = [tuple(record) for record in vectors]
+        with self.lock:
+            if records:
+                self._namespace(namespace, create=True).upsert(records)
+        result = {"upserted_count": len(records)}
+        return CompletedRequest(result) if async_req else result
+
+    def query(
+        self,
+        vector,
+        top_k=10,
+        namespace="",
+        filter=None,
+        include_metadata=True,
+        include_values=False,
+    ):
+        query = _as_query_vector(vector)
+        with self.lock:
+            ns = self._namespace(namespace)
+            if ns is None:
+                return {"matches": [], "namespace": namespace}
+            rows, scores = ns.search(query, top_k, filter, self.nprobe)
+            matches = []
+            for row, score in zip(rows, scores):
+                match = {"id": ns.ids[row], "score": float(score)}
+                if include_metadata:
+                    match["metadata"] = dict(ns.metadata[row] or {})
+                if include_values:
+                    match["values"] = ns.matrix[row].astype(np.float32).tolist()
+                matches.append(match)
+        return {"matches": matches, "namespace": namespace}
+
+    def delete(self, ids=None, delete_all=False, namespace=""):
+        with self.lock:
+            if delete_all:
+                if namespace in self.namespaces:
+                    self.namespaces[namespace] = self._new_namespace()
+                    self.namespaces[namespace].dirty = True
+            elif ids:
+                ns = self._namespace(namespace)
+                if ns is not None:
+                    ns.delete(ids)
+        return {}
+
+    def describe_index_stats(self):
+        with self.lock:
+            namespaces = {
+                name: {"vector_count": ns.count} for name, ns in self.namespaces.items()
+            }
+        return {
+            "dimension": self.dim,
+            "namespaces": namespaces,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
+
+    def flush(self):
+        """Persist every namespace changed since the last flush."""
+        with self.lock:
+            for namespace, ns in self.namespaces.items():
+                if ns.dirty:
+                    ns.save(os.path.join(self.root_dir, self._dir_name(namespace)), namespace)
+
+    @contextmanager
+    def batch_writer(self, pool_threads=30):
+        yield self
+        self.flush()